@@ -0,0 +1,110 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+# Process-wide cache of finished answers, looked up by question embedding.
+# A new question whose embedding is within SIMILARITY_THRESHOLD (cosine) of a
+# cached one gets the cached answer back instead of a retrieval + gpt-4o
+# round-trip. Entries expire after TTL_SECONDS, the least recently used are
+# evicted past MAX_ENTRIES, and everything is dropped when the knowledge-base
+# version changes.
+SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 60 * 60)))
+MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+
+_REPLAY_PIECE = re.compile(r"\S+\s*|\s+")
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    vector: np.ndarray
+    created: float
+    generation_seconds: float
+    hits: int = 0
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, ttl_seconds=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry.created > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, vector, version):
+        query = self._normalize(vector)
+        with self._lock:
+            self._check_version(version)
+            self._expire(time.time())
+            best_key, best_score = None, self.threshold
+            for key, entry in self._entries.items():
+                score = float(entry.vector @ query)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            entry.hits += 1
+            self.hits += 1
+            self.seconds_saved += entry.generation_seconds
+            return entry
+
+    def store(self, vector, question, answer, version, generation_seconds):
+        with self._lock:
+            self._check_version(version)
+            self._entries[question] = CachedAnswer(
+                question=question,
+                answer=answer,
+                vector=self._normalize(vector),
+                created=time.time(),
+                generation_seconds=generation_seconds,
+            )
+            self._entries.move_to_end(question)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "seconds_saved": self.seconds_saved,
+            }
+
+
+# Yields a cached answer word by word so it goes through st.write_stream
+# exactly like a live completion, just without the wait.
+def replay(entry):
+    for match in _REPLAY_PIECE.finditer(entry.answer):
+        yield match.group()
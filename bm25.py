@@ -0,0 +1,137 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+# Okapi BM25 over the same chunks as the vector index, so exact terms such as
+# "2FA", "LastPass", "https://" or a phone number are found even when their
+# embeddings aren't the closest match. Stored as per-chunk term counts so
+# chunks can be added and removed incrementally during ingestion.
+INDEX_NAME = "bm25.json"
+# Bump when tokenize() changes: a saved index with other terms is rebuilt.
+TOKENIZER_VERSION = 2
+
+K1 = 1.5
+B = 0.75
+
+_TOKEN = re.compile(
+    r"https?://"                                        # URL schemes, kept whole
+    r"|\+?1?[-.\s(]*\d{3}[-.\s)]*\d{3}[-.\s]*\d{4}"     # phone numbers
+    r"|[a-z0-9]+(?:[-'.][a-z0-9]+)*"                    # words, incl. wi-fi, 2fa, lastpass.com
+)
+_POSSESSIVE = re.compile(r"'s$")
+_NON_DIGIT = re.compile(r"\D")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it my of on or "
+    "should so that the their them they this to was what when where which who "
+    "why will with you your".split()
+)
+
+
+def tokenize(text):
+    tokens = []
+    for match in _TOKEN.finditer(text.lower().replace("\u2019", "'")):
+        # "Harvard's" and "Harvard’s" should match "harvard".
+        token = _POSSESSIVE.sub("", match.group())
+        digits = _NON_DIGIT.sub("", token)
+        if token.endswith("://"):
+            tokens.append(token)
+        elif len(digits) >= 10 and not any(c.isalpha() for c in token):
+            # 1-800-555-0100, (800) 555 0100 and 8005550100 are the same number.
+            tokens.append(digits[-10:])
+        elif token not in _STOPWORDS:
+            tokens.append(token)
+            if "-" in token or "." in token:
+                # "wi-fi" should also match "wifi"; "lastpass.com" also "lastpass".
+                if "-" in token:
+                    tokens.append(token.replace("-", ""))
+                tokens.extend(part for part in re.split(r"[-.]", token) if part not in _STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, doc_terms=None):
+        self._lock = threading.Lock()
+        self._doc_terms = {}
+        self._doc_lengths = {}
+        self._postings = defaultdict(dict)
+        self._total_length = 0
+        for doc_id, terms in (doc_terms or {}).items():
+            self._add(doc_id, terms)
+
+    @classmethod
+    def load(cls, directory):
+        path = os.path.join(directory, INDEX_NAME)
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        if records.get("tokenizer") != TOKENIZER_VERSION:
+            return cls()
+        return cls(records["doc_terms"])
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, INDEX_NAME)
+        with self._lock:
+            doc_terms = dict(self._doc_terms)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"tokenizer": TOKENIZER_VERSION, "doc_terms": doc_terms}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def _add(self, doc_id, terms):
+        self._remove(doc_id)
+        self._doc_terms[doc_id] = terms
+        self._doc_lengths[doc_id] = sum(terms.values())
+        self._total_length += self._doc_lengths[doc_id]
+        for term, count in terms.items():
+            self._postings[term][doc_id] = count
+
+    def _remove(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def add(self, doc_ids, texts):
+        with self._lock:
+            for doc_id, text in zip(doc_ids, texts):
+                self._add(doc_id, dict(Counter(tokenize(text))))
+
+    def delete(self, doc_ids):
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+
+    def clear(self):
+        self.delete(list(self._doc_terms))
+
+    # Returns [(doc_id, score)] best first.
+    def search(self, query, k=10):
+        with self._lock:
+            doc_count = len(self._doc_terms)
+            if not doc_count:
+                return []
+            average_length = self._total_length / doc_count
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, count in postings.items():
+                    length = self._doc_lengths[doc_id]
+                    scores[doc_id] += idf * count * (K1 + 1) / (
+                        count + K1 * (1 - B + B * length / average_length)
+                    )
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
@@ -0,0 +1,40 @@
+import os
+
+import streamlit as st
+
+import session_store
+
+# The apps' chat history. Drawing every message on every rerun makes long
+# sessions slower turn by turn, so only the newest WINDOW messages are drawn
+# and older ones stay behind a "load earlier" button that reveals them a
+# window at a time. The pane is a fragment: that button reruns the pane
+# alone, and clicks in other fragments (the quizzes) don't touch it. A full
+# rerun - a new question - still redraws it, but at most the window.
+WINDOW = int(os.getenv("CHAT_WINDOW_MESSAGES", "20"))
+
+
+def _show_earlier(shown_key, step):
+    st.session_state[shown_key] += step
+
+
+# Call where the history loop was. The messages are read from session_state
+# on each run, so turns added after the call show up on the next one.
+@st.fragment
+def render_history(messages_key="messages", window=WINDOW):
+    session_store.reload()
+    messages = st.session_state[messages_key]
+    shown_key = f"{messages_key}_shown"
+    if shown_key not in st.session_state:
+        st.session_state[shown_key] = window
+    shown = st.session_state[shown_key]
+
+    hidden = len(messages) - shown
+    if hidden > 0:
+        st.button(
+            f"⬆️ Load earlier messages ({hidden} more)",
+            key=f"{messages_key}_load_earlier",
+            on_click=_show_earlier,
+            args=(shown_key, window),
+        )
+    for msg in messages[max(hidden, 0):]:
+        st.chat_message(msg["role"]).markdown(msg["content"])
@@ -1,42 +1,97 @@
 import streamlit as st
-from openai import OpenAI
-from os import environ
+import chat_pane
+import doc_index
+import knowledge_base
+import llm_client
+import prompt_builder
+import streaming
+from usage_ledger import StreamMeter
+
+
+# Indexes of uploaded documents, shared by every session in the process.
+@st.cache_resource
+def get_document_cache():
+    return doc_index.DocumentIndexCache()
+
+
+# Indexes uploads in the background so the page never waits on them.
+@st.cache_resource
+def get_ingestor():
+    return doc_index.DocumentIngestor(get_document_cache(), knowledge_base.get_embeddings())
+
 
 st.title("📝 File Q&A with OpenAI")
-uploaded_file = st.file_uploader("Upload an article", type=("txt", "md"))
+uploaded_files = st.file_uploader("Upload articles", type=("txt", "md", "pdf"), accept_multiple_files=True)
+
+# Hash each upload once per session rather than on every rerun, and submit
+# it again only when its index was evicted or its indexing failed
+if "upload_keys" not in st.session_state:
+    st.session_state["upload_keys"] = {}
+upload_keys = st.session_state["upload_keys"]
+stale = get_ingestor().stale(upload_keys.values())
+for uploaded_file in uploaded_files:
+    key = upload_keys.get(uploaded_file.file_id)
+    if key is None or key in stale:
+        upload_keys[uploaded_file.file_id] = get_ingestor().submit(uploaded_file.getvalue(), uploaded_file.name)
+keys = [upload_keys[uploaded_file.file_id] for uploaded_file in uploaded_files]
+pending = [job for job in get_ingestor().status(keys) if not job.finished]
+
+
+# Redraws only itself every second while files are still being indexed, and
+# reruns the page each time another one finishes, so the chat input picks up
+# every index as soon as it is ready instead of waiting for the slowest file.
+@st.fragment(run_every=1.0 if pending else None)
+def show_progress():
+    jobs = get_ingestor().status(keys)
+    for job in jobs:
+        if job.stage == "failed":
+            st.error(f"{job.name}: could not be indexed ({job.error})")
+        elif job.stage != "ready":
+            st.progress(job.fraction, text=f"{job.name}: {job.stage}")
+    if pending and sum(job.finished for job in jobs) > len(jobs) - len(pending):
+        st.rerun()
+
+
+show_progress()
+indexes = get_ingestor().ready(keys)
 
 question = st.chat_input(
-    "Ask something about the article",
-    disabled=not uploaded_file,
+    "Ask something about the articles",
+    disabled=not indexes,
 )
 
 if "messages" not in st.session_state:
     st.session_state["messages"] = [{"role": "assistant", "content": "Ask something about the article"}]
 
-for msg in st.session_state.messages:
-    st.chat_message(msg["role"]).write(msg["content"])
+chat_pane.render_history()
 
-if question and uploaded_file:
-    # Read the content of the uploaded file
-    file_content = uploaded_file.read().decode("utf-8")
-    print(file_content)
-    
-    client = OpenAI(api_key=environ['OPENAI_API_KEY'])
+if question and indexes:
+    client = llm_client.get_client()
 
     # Append the user's question to the messages
     st.session_state.messages.append({"role": "user", "content": question})
     st.chat_message("user").write(question)
 
+    # Answer from the files indexed so far; the rest join as they finish
+    passages = doc_index.search_documents(indexes, question, embeddings=get_ingestor().embeddings)
+    names = ", ".join(name for name, _ in indexes)
+    prompt_plan = prompt_builder.build_prompt(
+        "Answer questions about the user's uploaded documents using the passages given with each question.",
+        st.session_state.messages,
+        passages,
+        model="gpt-4o",
+        context_header=f"Here are the relevant passages from {names}:",
+    )
+
+    meter = StreamMeter("gpt-4o", app="chat_with_pdf", prefix=prompt_plan.prefix_hash)
     with st.chat_message("assistant"):
         stream = client.chat.completions.create(
             model="gpt-4o",  # Change this to a valid model name
-            messages=[
-                {"role": "system", "content": f"Here's the content of the file:\n\n{file_content}"},
-                *st.session_state.messages
-            ],
-            stream=True
+            messages=prompt_plan.messages,
+            stream=True,
+            stream_options={"include_usage": True}
         )
-        response = st.write_stream(stream)
+        response = streaming.write_stream(meter.wrap(stream))
 
     # Append the assistant's response to the messages
     st.session_state.messages.append({"role": "assistant", "content": response})
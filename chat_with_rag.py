@@ -1,67 +1,88 @@
 import streamlit as st
-from openai import AzureOpenAI
-from openai import OpenAI
-from os import environ
+import chat_pane
+import llm_client
+import prompt_builder
+import session_store
+import streaming
+import text_kb
+import time
+import tracing
+from usage_ledger import StreamMeter
+
+tracing.start_exporters()
 
 st.title("RAG Chatbot")
 st.caption("Powered by INFO-5940")
 
+
+# Loaded, chunked and indexed once per process; refresh() re-reads only the
+# files that changed on disk.
+@st.cache_resource
+def get_knowledge_base():
+    return text_kb.TextKnowledgeBase(text_kb.KB_DIRECTORY)
+
+
+session_store.attach("chat_with_rag", ("messages",))
 if "messages" not in st.session_state:
     st.session_state["messages"] = [{"role": "assistant", "content": "Hello! How can I help you today?"}]
 
-for msg in st.session_state.messages:
-    st.chat_message(msg["role"]).write(msg["content"])
+chat_pane.render_history()
 
 if prompt := st.chat_input():
 
     
 
-    client = OpenAI(api_key=environ['OPENAI_API_KEY'])
+    client = llm_client.get_client()
 
     st.session_state.messages.append({"role": "user", "content": prompt})
     st.chat_message("user").write(prompt)
 
-    response = client.chat.completions.create(model="gpt-4o-mini", 
-                                              messages=[
-            {
-                "role": "system",
-                "content": """Your job is to guess which knowledge base I need to load based on the user 
-                prompt. The available knowledge bases are:
-                harvard.txt, cornell.txt, duke.txt if these are not related to the prompt please 
-                output none.txt.
-                I want you output to only be the name of the file. and nothing else.""",
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ])
-    print(response.choices[0].message.content)
-
-    if response.choices[0].message.content in ["harvard.txt", "cornell.txt", "duke.txt"]:
-        knowledge_base_file_path = "/workspace/data/knowledge_base"
-        with open(f"{knowledge_base_file_path}/{response.choices[0].message.content}", "r") as file:
-            content = file.read()
-
-        print(content)
+    # Routed locally when the question clearly points at one file; the LLM
+    # router is only asked when it doesn't
+    turn_started = time.perf_counter()
+    with tracing.span("chat_with_rag", "refresh_kb"):
+        kb = get_knowledge_base().refresh()
+    started = time.perf_counter()
+    route = text_kb.route_prompt(kb.router, client, prompt)
+    tracing.observe("chat_with_rag", "route_llm" if route.source == "llm" else "route_local", time.perf_counter() - started)
+
+    if route.file in kb.files:
+        # Only the passages of the file that match the question
+        with tracing.span("chat_with_rag", "retrieve"):
+            passages = kb.passages(route.file, prompt)
+
+        with tracing.span("chat_with_rag", "build_prompt"):
+            prompt_plan = prompt_builder.build_prompt(
+                "Answer using the knowledge-base passages given with each question.",
+                st.session_state.messages,
+                passages,
+                model="gpt-4o",
+                context_header=f"Here are the relevant passages from {route.file}:",
+            )
 
+        meter = StreamMeter("gpt-4o", app="chat_with_rag", prefix=prompt_plan.prefix_hash)
         with st.chat_message("assistant"):
             stream = client.chat.completions.create(
                 model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": f"Here's the content of the file:\n\n{content}"},
-                    *st.session_state.messages
-                ],
-                stream=True
+                messages=prompt_plan.messages,
+                stream=True,
+                stream_options={"include_usage": True}
             )
-            response = st.write_stream(stream)
+            response = streaming.write_stream(meter.wrap(stream))
     
     else:
+        prompt_plan = prompt_builder.build_prompt(None, st.session_state.messages, model="gpt-4o")
+        meter = StreamMeter("gpt-4o", app="chat_with_rag")
         with st.chat_message("assistant"):
             stream = client.chat.completions.create(model="gpt-4o", 
-                                                    messages=st.session_state.messages,
-                                                    stream=True)
-            response = st.write_stream(stream)
+                                                    messages=prompt_plan.messages,
+                                                    stream=True,
+                                                    stream_options={"include_usage": True})
+            response = streaming.write_stream(meter.wrap(stream))
 
+    tracing.observe_stream("chat_with_rag", meter)
+    tracing.observe("chat_with_rag", "total", time.perf_counter() - turn_started)
     st.session_state.messages.append({"role": "assistant", "content": response})
 
+session_store.sync()
+tracing.render_debug_panel("chat_with_rag")
@@ -0,0 +1,333 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from bm25 import BM25Index
+from retrieval import reciprocal_rank_fusion
+from text_kb import split_text
+
+logger = logging.getLogger(__name__)
+
+# Uploaded documents are parsed, chunked and embedded once and kept in memory
+# keyed by the SHA-256 of their bytes, so every later question - and every
+# other session that uploads the same file - retrieves from the same index
+# instead of sending the whole document again. The cache is bounded by the
+# memory its indexes use and evicts the least recently used one first, but
+# never one a session asked for in the last PIN_SECONDS: otherwise a session
+# whose uploads together exceed the budget would have its files evict each
+# other and be re-embedded on every rerun. Such sessions push the cache over
+# budget (with a warning) instead, so CACHE_MB should comfortably hold the
+# uploads of every session active at once.
+# Because the same bytes may be uploaded under different names, an index
+# holds no file name; callers pass theirs in when they search.
+CACHE_MB = int(os.getenv("DOC_INDEX_CACHE_MB", "256"))
+PIN_SECONDS = float(os.getenv("DOC_INDEX_PIN_SECONDS", "300"))
+PASSAGES_K = int(os.getenv("DOC_INDEX_PASSAGES", "4"))
+INGEST_WORKERS = int(os.getenv("DOC_INGEST_WORKERS", "4"))
+# Jobs remembered by the ingestor; the oldest finished ones go first.
+MAX_JOBS = int(os.getenv("DOC_INGEST_MAX_JOBS", "256"))
+MAX_ATTEMPTS = 3
+EMBED_BATCH = 64
+CANDIDATES = 10
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# Returns [(page number or None, text)].
+def extract_pages(data, name):
+    if name.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+
+        reader = PdfReader(io.BytesIO(data))
+        return [(page_no + 1, page.extract_text() or "") for page_no, page in enumerate(reader.pages)]
+    return [(None, data.decode("utf-8", errors="replace"))]
+
+
+class DocumentIndex:
+    def __init__(self, chunks, pages, vectors=None, complete=True):
+        self.chunks = chunks
+        self.pages = pages  # page number of each chunk, or None
+        self.vectors = vectors  # unit rows, or None for keyword-only search
+        # False when embedding failed: the index still answers by keyword,
+        # but isn't cached, so the next upload of the file tries again.
+        self.complete = complete
+        self.lexical_index = BM25Index()
+        self.lexical_index.add(range(len(chunks)), chunks)
+
+    @property
+    def nbytes(self):
+        vector_bytes = self.vectors.nbytes if self.vectors is not None else 0
+        # Text once for the chunks and about once more for the term counts.
+        return vector_bytes + 2 * sum(len(chunk) for chunk in self.chunks)
+
+    # The k passages that best match the query, best first, cited as `name`.
+    # Uses embeddings and BM25 together when the index has vectors and the
+    # query can be embedded, BM25 alone otherwise.
+    def search(self, query, k=PASSAGES_K, embeddings=None, name=None):
+        rankings = [[row for row, _ in self.lexical_index.search(query, CANDIDATES)]]
+        if self.vectors is not None and embeddings is not None and len(self.chunks):
+            try:
+                query_vector = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+            except Exception:
+                logger.exception("Could not embed the query; using keyword search only")
+            else:
+                query_vector /= np.linalg.norm(query_vector) or 1.0
+                scores = self.vectors @ query_vector
+                top = np.argsort(-scores)[:CANDIDATES]
+                rankings.append([int(row) for row in top])
+        rows = reciprocal_rank_fusion(rankings, [1.0] * len(rankings))[:k]
+        if not rows:
+            rows = range(min(k, len(self.chunks)))
+        return [self.passage(row, name) for row in rows]
+
+    def passage(self, row, name=None):
+        page = self.pages[row]
+        if name and page:
+            return f"[{name}, page {page}]\n{self.chunks[row]}"
+        return self.chunks[row]
+
+
+# progress, if given, is called as progress(stage, done, total) while the
+# document is parsed and embedded.
+def build_index(data, name, embeddings=None, progress=None, batch_size=EMBED_BATCH):
+    progress = progress or (lambda stage, done, total: None)
+    progress("parsing", 0, 1)
+    pages = extract_pages(data, name)
+    chunks = []
+    chunk_pages = []
+    for page_no, text in pages:
+        for chunk in split_text(text):
+            chunks.append(chunk)
+            chunk_pages.append(page_no)
+
+    vectors = None
+    complete = True
+    if embeddings is not None and chunks:
+        try:
+            rows = []
+            for start in range(0, len(chunks), batch_size):
+                progress("embedding", start, len(chunks))
+                rows.extend(embeddings.embed_documents(chunks[start:start + batch_size]))
+            vectors = np.asarray(rows, dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        except Exception:
+            # Keyword search still works; the next upload of this file retries.
+            logger.exception("Could not embed %s; using keyword search only", name)
+            vectors = None
+            complete = False
+    logger.info("Indexed %s: %d chunks", name, len(chunks))
+    return DocumentIndex(chunks, chunk_pages, vectors, complete)
+
+
+class DocumentIndexCache:
+    def __init__(self, max_bytes=CACHE_MB * 1024 * 1024, pin_seconds=PIN_SECONDS):
+        self.max_bytes = max_bytes
+        self.pin_seconds = pin_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._used = {}  # key -> when a session last asked for it
+        self._building = {}  # key -> Event, so concurrent uploads build once
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                self._used[key] = time.monotonic()
+            return index
+
+    def put(self, key, index):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).nbytes
+            self._entries[key] = index
+            self._used[key] = time.monotonic()
+            self._bytes += index.nbytes
+            pinned_after = time.monotonic() - self.pin_seconds
+            for old_key in list(self._entries):
+                if self._bytes <= self.max_bytes:
+                    break
+                if old_key == key or self._used[old_key] > pinned_after:
+                    continue
+                self._bytes -= self._entries.pop(old_key).nbytes
+                del self._used[old_key]
+                logger.info("Evicted document index %s", old_key[:12])
+            if self._bytes > self.max_bytes:
+                logger.warning(
+                    "Document indexes in use take %.0f MB, over the %.0f MB budget (DOC_INDEX_CACHE_MB)",
+                    self._bytes / (1024 * 1024), self.max_bytes / (1024 * 1024),
+                )
+
+    def get_or_build(self, data, name, embeddings=None, progress=None):
+        key = content_key(data)
+        while True:
+            with self._lock:
+                index = self._entries.get(key)
+                if index is not None:
+                    self._entries.move_to_end(key)
+                    self._used[key] = time.monotonic()
+                    self.hits += 1
+                    return index
+                building = self._building.get(key)
+                if building is None:
+                    self.misses += 1
+                    building = self._building[key] = threading.Event()
+                    break
+            # Another session is indexing the same bytes; wait and reuse it.
+            building.wait()
+
+        try:
+            index = build_index(data, name, embeddings, progress)
+            if index.complete:
+                self.put(key, index)
+            return index
+        finally:
+            with self._lock:
+                del self._building[key]
+            building.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "megabytes": self._bytes / (1024 * 1024),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Best passages across several documents, given as [(name, index)]: each
+# document's ranking is fused with reciprocal rank fusion, so no single file
+# crowds out the others.
+def search_documents(indexes, query, k=PASSAGES_K, embeddings=None):
+    rankings = [
+        [(i, passage) for passage in index.search(query, k, embeddings, name)]
+        for i, (name, index) in enumerate(indexes)
+    ]
+    return [passage for _, passage in reciprocal_rank_fusion(rankings, [1.0] * len(rankings))[:k]]
+
+
+# ---- BACKGROUND INGESTION ----
+# Indexes uploads on a thread pool so the Streamlit script never waits for
+# parsing or embedding. submit() returns at once; status() reports progress
+# for the UI, and ready() hands out the indexes that are done so questions
+# can be answered from them while the rest are still processing. stale()
+# names the uploads to submit again: their index was evicted, their job was
+# forgotten, or their indexing failed and has attempts left.
+class IngestJob:
+    def __init__(self, key, name):
+        self.key = key
+        self.name = name
+        self.stage = "queued"
+        self.done = 0
+        self.total = 1
+        self.error = None
+        self.index = None  # set when the index couldn't be cached
+        self.attempts = 1
+
+    @property
+    def finished(self):
+        return self.stage in ("ready", "failed")
+
+    # Failed, or finished without embeddings: a new submit tries again, up
+    # to MAX_ATTEMPTS times.
+    @property
+    def retryable(self):
+        failed = self.stage == "failed" or (self.stage == "ready" and self.index is not None)
+        return failed and self.attempts < MAX_ATTEMPTS
+
+    @property
+    def fraction(self):
+        if self.stage == "ready":
+            return 1.0
+        if self.stage == "embedding":
+            # Parsing is the first tenth, embedding the rest.
+            return 0.1 + 0.9 * self.done / max(self.total, 1)
+        return 0.0
+
+    def update(self, stage, done, total):
+        self.stage, self.done, self.total = stage, done, total
+
+
+class DocumentIngestor:
+    def __init__(self, cache, embeddings=None, workers=INGEST_WORKERS):
+        self.cache = cache
+        self.embeddings = embeddings
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="doc-ingest")
+
+    def submit(self, data, name):
+        key = content_key(data)
+        with self._lock:
+            job = self._jobs.get(key)
+            if not self._needs_submit(job):
+                return key
+            previous = job
+            self._jobs.pop(key, None)
+            job = self._jobs[key] = IngestJob(key, name)
+            if previous is not None:
+                # Keep answering by keyword while the embedding is retried.
+                job.index = previous.index
+                job.attempts = previous.attempts + 1 if previous.retryable else 1
+            self._forget_finished()
+        if self.cache.get(key) is not None:
+            job.index = None
+            job.update("ready", 1, 1)
+        else:
+            self._executor.submit(self._run, job, data)
+        return key
+
+    def _run(self, job, data):
+        try:
+            index = self.cache.get_or_build(data, job.name, self.embeddings, progress=job.update)
+            job.index = None if index.complete else index
+            job.update("ready", 1, 1)
+        except Exception as error:
+            logger.exception("Could not index %s", job.name)
+            job.error = str(error)
+            job.update("failed", 0, 1)
+
+    def _forget_finished(self):
+        finished = [key for key, job in self._jobs.items() if job.finished]
+        for key in finished[:max(len(self._jobs) - MAX_JOBS, 0)]:
+            del self._jobs[key]
+
+    def status(self, keys):
+        with self._lock:
+            return [self._jobs[key] for key in keys if key in self._jobs]
+
+    def _index(self, job):
+        if job.index is None and job.stage == "ready":
+            return self.cache.get(job.key)
+        return job.index
+
+    # [(name, index)] for the given keys that are ready now.
+    def ready(self, keys):
+        indexes = []
+        for job in self.status(keys):
+            index = self._index(job)
+            if index is not None:
+                indexes.append((job.name, index))
+        return indexes
+
+    def _needs_submit(self, job):
+        return job is None or job.retryable or (job.stage == "ready" and self._index(job) is None)
+
+    def stale(self, keys):
+        with self._lock:
+            return {key for key in keys if self._needs_submit(self._jobs.get(key))}
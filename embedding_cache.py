@@ -0,0 +1,203 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Embeddings are cached on disk keyed by (model, hash of the normalized text).
+# SQLite maps each key to a row number; the vectors themselves are appended to
+# one float32 file per model and read back through a memory map, so a warm
+# cache costs a lookup and a slice instead of a network call.
+DEFAULT_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./.embedding_cache")
+DEFAULT_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+DEFAULT_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._maps = {}
+        self._db = sqlite3.connect(
+            os.path.join(cache_dir, "embeddings.sqlite3"),
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=30,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS models (model TEXT PRIMARY KEY, dim INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            " model TEXT NOT NULL, key TEXT NOT NULL, row INTEGER NOT NULL,"
+            " PRIMARY KEY (model, key))"
+        )
+
+    def _vector_path(self, model):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        return os.path.join(self.cache_dir, f"{safe_name}.f32")
+
+    def _dim(self, model):
+        row = self._db.execute("SELECT dim FROM models WHERE model = ?", (model,)).fetchone()
+        return row[0] if row else None
+
+    def _matrix(self, model, dim, min_rows):
+        matrix = self._maps.get(model)
+        if matrix is None or len(matrix) < min_rows:
+            path = self._vector_path(model)
+            rows = os.path.getsize(path) // (dim * 4)
+            matrix = np.memmap(path, dtype=np.float32, mode="r", shape=(rows, dim))
+            self._maps[model] = matrix
+        return matrix
+
+    # Returns {key: vector} for the keys that are cached.
+    def get_many(self, model, keys):
+        if not keys:
+            return {}
+        with self._lock:
+            dim = self._dim(model)
+            if dim is None:
+                return {}
+            rows = {}
+            unique_keys = list(set(keys))
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows.update(self._db.execute(
+                    f"SELECT key, row FROM vectors WHERE model = ? AND key IN ({placeholders})",
+                    (model, *batch),
+                ).fetchall())
+            if not rows:
+                return {}
+            matrix = self._matrix(model, dim, max(rows.values()) + 1)
+            return {key: np.array(matrix[row]) for key, row in rows.items()}
+
+    def put_many(self, model, items):
+        if not items:
+            return
+        vectors = np.asarray([vector for _, vector in items], dtype=np.float32)
+        dim = vectors.shape[1]
+        with self._lock:
+            # BEGIN IMMEDIATE takes SQLite's write lock, which also serializes
+            # appends to the vector file between processes sharing the cache.
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                known_dim = self._dim(model)
+                if known_dim is None:
+                    self._db.execute("INSERT INTO models (model, dim) VALUES (?, ?)", (model, dim))
+                elif known_dim != dim:
+                    raise ValueError(f"{model} returned {dim}-d vectors, cache holds {known_dim}-d")
+
+                path = self._vector_path(model)
+                with open(path, "ab") as f:
+                    # Rows come from the file size, so bytes left behind by an
+                    # interrupted write are simply never referenced.
+                    first_row = f.seek(0, os.SEEK_END) // (dim * 4)
+                    if f.tell() != first_row * dim * 4:
+                        f.truncate(first_row * dim * 4)
+                        f.seek(first_row * dim * 4)
+                    f.write(vectors.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO vectors (model, key, row) VALUES (?, ?, ?)",
+                    [(model, key, first_row + i) for i, (key, _) in enumerate(items)],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(
+        self,
+        embeddings,
+        model,
+        store=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        max_concurrency=DEFAULT_CONCURRENCY,
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.store = store or EmbeddingStore()
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _count(self, hits, misses):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+
+    # Embeds the texts that missed the cache in batches of `batch_size`,
+    # running up to `max_concurrency` requests at once.
+    def _embed_missing(self, texts):
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1 or self.max_concurrency <= 1:
+            results = [self.embeddings.embed_documents(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                results = list(pool.map(self.embeddings.embed_documents, batches))
+        return [vector for batch in results for vector in batch]
+
+    def embed_documents(self, texts):
+        keys = [text_key(text) for text in texts]
+        cached = self.store.get_many(self.model, keys)
+
+        # Identical texts within one call are only embedded once.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        miss_count = sum(key in missing for key in keys)
+        self._count(len(keys) - miss_count, miss_count)
+
+        if missing:
+            vectors = self._embed_missing(list(missing.values()))
+            fresh = list(zip(missing.keys(), vectors))
+            self.store.put_many(self.model, fresh)
+            cached.update((key, np.asarray(vector, dtype=np.float32)) for key, vector in fresh)
+
+        return [cached[key].tolist() for key in keys]
+
+    def embed_query(self, text):
+        key = text_key(text)
+        cached = self.store.get_many(self.model, [key])
+        if key in cached:
+            self._count(1, 0)
+            return cached[key].tolist()
+
+        self._count(0, 1)
+        vector = self.embeddings.embed_query(text)
+        self.store.put_many(self.model, [(key, vector)])
+        return list(vector)
@@ -0,0 +1,293 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from langchain_core.documents import Document
+
+import kb_manifest
+
+logger = logging.getLogger(__name__)
+
+# Knowledge-base ingestion as a three-stage pipeline:
+#   parse (process pool) -> split (thread) -> embed + store (caller's thread)
+# Stages are joined by bounded queues and PDFs are parsed a few pages at a
+# time, so memory stays flat no matter how large the corpus gets. If any
+# stage fails, a stop event unblocks the others and the parser pool is shut
+# down before the error reaches the caller.
+PAGES_PER_TASK = 8
+QUEUE_POLL_SECONDS = 0.1
+PAGE_QUEUE_SIZE = 64
+CHUNK_QUEUE_SIZE = 512
+EMBED_BATCH_SIZE = 256
+
+_DONE = object()
+
+
+@dataclass
+class IngestStats:
+    pages: int = 0
+    chunks: int = 0
+    embeddings: int = 0
+    # Time each stage spent on its own work, not waiting on the stages
+    # around it, so the rates below are per stage.
+    stage_seconds: dict = field(default_factory=dict)
+
+    def add_time(self, name, seconds):
+        self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+
+    def rate(self, name, count):
+        seconds = self.stage_seconds.get(name)
+        return count / seconds if seconds else 0.0
+
+    def summary(self):
+        return (
+            f"pages {self.pages} ({self.rate('parse', self.pages):.1f}/s), "
+            f"chunks {self.chunks} ({self.rate('split', self.chunks):.1f}/s), "
+            f"embeddings {self.embeddings} ({self.rate('embed', self.embeddings):.1f}/s)"
+        )
+
+
+class _StageFailed:
+    def __init__(self, error):
+        self.error = error
+
+
+def _parse_pages(path, start, stop):
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return path, [(page_no, reader.pages[page_no].extract_text()) for page_no in range(start, stop)]
+
+
+# Yields (path, page_no, text) for every page, in order, while a process pool
+# parses ahead. At most two tasks per worker are in flight at once.
+def iter_pdf_pages(pdf_paths, workers=None, pages_per_task=PAGES_PER_TASK):
+    from pypdf import PdfReader
+
+    tasks = deque()
+    for path in pdf_paths:
+        page_count = len(PdfReader(path).pages)
+        for start in range(0, page_count, pages_per_task):
+            tasks.append((path, start, min(start + pages_per_task, page_count)))
+    if not tasks:
+        return
+
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    # spawn rather than fork: this also runs inside the threaded Streamlit server.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+        try:
+            while tasks and len(pending) < workers * 2:
+                pending.append(pool.submit(_parse_pages, *tasks.popleft()))
+            while pending:
+                path, pages = pending.popleft().result()
+                if tasks:
+                    pending.append(pool.submit(_parse_pages, *tasks.popleft()))
+                for page_no, text in pages:
+                    yield path, page_no, text
+        finally:
+            # Closed early (a later stage failed): drop the queued tasks so
+            # leaving the with block only waits for the ones already running.
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Queue put/get that give up once `stop` is set instead of blocking forever.
+def _put(out_queue, item, stop):
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=QUEUE_POLL_SECONDS)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+# Yields items from a stage's queue. Time spent waiting for them is taken off
+# the consuming stage's work time when `name` is given.
+def _drain(in_queue, stop, stats=None, name=None):
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            item = in_queue.get(timeout=QUEUE_POLL_SECONDS)
+        except queue.Empty:
+            continue
+        finally:
+            if name is not None:
+                stats.add_time(name, -(time.perf_counter() - started))
+        if item is _DONE:
+            return
+        if isinstance(item, _StageFailed):
+            raise item.error
+        yield item
+
+
+def _run_stage(items, out_queue, stats, name, stop):
+    try:
+        while True:
+            started = time.perf_counter()
+            item = next(items, _DONE)
+            stats.add_time(name, time.perf_counter() - started)
+            if not _put(out_queue, item, stop) or item is _DONE:
+                return
+    except BaseException as error:
+        _put(out_queue, _StageFailed(error), stop)
+    finally:
+        items.close()
+
+
+def _start_stage(items, out_queue, stats, name, stop):
+    thread = threading.Thread(
+        target=_run_stage, args=(items, out_queue, stats, name, stop), name=f"ingest-{name}", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+# Turns parsed pages into (chunk_id, Document) pairs for chunks the index does
+# not have yet, recording every page's hash and chunk ids in `manifest`.
+def _split_pages(pages, splitter, manifest, old_manifest, known_ids, stats):
+    old_files = old_manifest["files"]
+    for path, page_no, text in pages:
+        stats.pages += 1
+        page_hash = kb_manifest.text_sha256(text)
+        old_pages = old_files[path]["pages"] if path in old_files else []
+        if page_no < len(old_pages) and old_pages[page_no]["sha256"] == page_hash:
+            manifest["files"][path]["pages"].append(old_pages[page_no])
+            continue
+
+        page = Document(page_content=text, metadata={"source": path, "page": page_no})
+        ids = []
+        occurrences = {}
+        for chunk in splitter.split_documents([page]):
+            occurrence = occurrences[chunk.page_content] = occurrences.get(chunk.page_content, -1) + 1
+            cid = kb_manifest.chunk_id(path, chunk.page_content, occurrence)
+            chunk.metadata["chunk_id"] = cid
+            ids.append(cid)
+            stats.chunks += 1
+            if cid not in known_ids:
+                known_ids.add(cid)  # the same text again later in this run
+                yield cid, chunk
+        manifest["files"][path]["pages"].append({"sha256": page_hash, "chunk_ids": ids})
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Brings `store` in line with the files on disk: only files whose hash
+# changed are parsed, only pages whose hash changed are split, only chunk ids
+# the index doesn't have are embedded, and ids that no longer exist are
+# deleted. `lexical_index`, if given, is kept in step with the store.
+# Returns (manifest, added, removed, stats).
+def sync_index(
+    store,
+    pdf_paths,
+    manifest_path,
+    splitter,
+    settings,
+    workers=None,
+    embed_batch_size=EMBED_BATCH_SIZE,
+    lexical_index=None,
+):
+    old_manifest = kb_manifest.load_manifest(manifest_path, settings)
+    if old_manifest is None:
+        if store.count():
+            # Vectors from before the manifest existed (or from other
+            # settings) can't be matched to files, so start over once.
+            logger.warning("No usable manifest at %s; rebuilding the index", manifest_path)
+            store.delete(ids=store.ids())
+            if lexical_index is not None:
+                lexical_index.clear()
+        old_manifest = kb_manifest.empty_manifest(settings)
+
+    manifest = kb_manifest.empty_manifest(settings)
+    changed_paths = []
+    for pdf_path in pdf_paths:
+        digest = kb_manifest.file_sha256(pdf_path)
+        old_entry = old_manifest["files"].get(pdf_path)
+        if old_entry and old_entry["sha256"] == digest:
+            manifest["files"][pdf_path] = old_entry
+        else:
+            manifest["files"][pdf_path] = {"sha256": digest, "pages": []}
+            changed_paths.append(pdf_path)
+
+    stats = IngestStats()
+    if changed_paths:
+        known_ids = kb_manifest.chunk_ids(old_manifest)
+        page_queue = queue.Queue(maxsize=PAGE_QUEUE_SIZE)
+        chunk_queue = queue.Queue(maxsize=CHUNK_QUEUE_SIZE)
+        stop = threading.Event()
+        stages = [
+            _start_stage(iter_pdf_pages(changed_paths, workers), page_queue, stats, "parse", stop),
+            _start_stage(
+                _split_pages(_drain(page_queue, stop, stats, "split"), splitter, manifest, old_manifest, known_ids, stats),
+                chunk_queue, stats, "split", stop,
+            ),
+        ]
+        try:
+            for batch in _batches(_drain(chunk_queue, stop), embed_batch_size):
+                started = time.perf_counter()
+                ids = [cid for cid, _ in batch]
+                chunks = [chunk for _, chunk in batch]
+                store.add_documents(chunks, ids=ids)
+                if lexical_index is not None:
+                    lexical_index.add(ids, [chunk.page_content for chunk in chunks])
+                stats.embeddings += len(batch)
+                stats.add_time("embed", time.perf_counter() - started)
+        finally:
+            # A no-op after a clean run; after a failure it unblocks the
+            # stages, which close their generators and the parser pool.
+            stop.set()
+            for thread in stages:
+                thread.join()
+
+    added_ids, removed_ids = kb_manifest.diff(old_manifest, manifest)
+    if removed_ids:
+        store.delete(ids=sorted(removed_ids))
+        if lexical_index is not None:
+            lexical_index.delete(removed_ids)
+    store.persist()
+
+    kb_manifest.save_manifest(manifest_path, manifest)
+    return manifest, len(added_ids), len(removed_ids), stats
+
+
+# Pre-builds (or updates) the knowledge-base index outside Streamlit, e.g.
+#   python ingest.py --workers 8
+def main(argv=None):
+    import knowledge_base
+
+    parser = argparse.ArgumentParser(description="Build or update the safety-guide vector index.")
+    parser.add_argument("pdfs", nargs="*", help="PDF files to index (default: knowledge_base.PDF_PATHS)")
+    parser.add_argument("--persist-directory", default=knowledge_base.PERSIST_DIRECTORY)
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    index = knowledge_base.load_index(
+        pdf_paths=args.pdfs or knowledge_base.PDF_PATHS,
+        persist_directory=args.persist_directory,
+        workers=args.workers,
+    )
+    print(f"Index {index.status} (version {index.version}): +{index.added}/-{index.removed} chunks")
+    print(index.ingest_stats.summary())
+    print(f"Embedding cache: {knowledge_base.get_embeddings().stats()}")
+
+
+if __name__ == "__main__":
+    main()
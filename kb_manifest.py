@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+
+# The manifest lives next to the vector index and records, for every ingested
+# file, the hash of the file, the hash of each page and the ids of the chunks
+# embedded from that page. Chunk ids are content-addressed - the file and the
+# chunk text, not its page or position - so an unchanged chunk keeps its id
+# (and its vector) when pages or chunks before it are added or removed.
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 2
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# `occurrence` tells apart identical chunks on the same page; the same text
+# on two pages of a file is one chunk with one vector.
+def chunk_id(source, text, occurrence=0):
+    return text_sha256(f"{source}\x00{occurrence}\x00{text}")
+
+
+def empty_manifest(settings):
+    return {"version": MANIFEST_VERSION, "settings": settings, "files": {}}
+
+
+# Returns None when there is no manifest, or when it was written with
+# different settings (splitter, embedding model) and so describes vectors we
+# can no longer trust.
+def load_manifest(path, settings):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("settings") != settings:
+        return None
+    return manifest
+
+
+def save_manifest(path, manifest):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def chunk_ids(manifest):
+    return {
+        cid
+        for entry in manifest["files"].values()
+        for page in entry["pages"]
+        for cid in page["chunk_ids"]
+    }
+
+
+# Version string for the indexed content; changes whenever any file does.
+def content_version(manifest):
+    files = sorted((path, entry["sha256"]) for path, entry in manifest["files"].items())
+    return text_sha256(json.dumps([manifest["settings"], files]))[:16]
+
+
+def diff(old_manifest, new_manifest):
+    old_ids = chunk_ids(old_manifest)
+    new_ids = chunk_ids(new_manifest)
+    return new_ids - old_ids, old_ids - new_ids
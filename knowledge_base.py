@@ -0,0 +1,128 @@
+import functools
+import logging
+import os
+import threading
+from dataclasses import dataclass
+
+import ingest
+import kb_manifest
+import llm_client
+import vector_store
+from bm25 import BM25Index
+from query_cache import QueryCache
+from retrieval import HybridRetriever
+from embedding_cache import CachedEmbeddings
+
+logger = logging.getLogger(__name__)
+
+# ---- SETUP ----
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+PDF_PATHS = [
+    "data/knowledge_base/engAGED_Online+Safety+1_508.pdf",
+    "data/knowledge_base/engAGED_Online+Safety+2_508.pdf",
+    "data/knowledge_base/engAGED_Online+Safety+3_508.pdf"
+]
+# "numpy" (default) or "chroma"; see vector_store.py.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "numpy")
+PERSIST_DIRECTORIES = {"numpy": "./vector_index", "chroma": "./chroma_db"}
+PERSIST_DIRECTORY = os.getenv("VECTOR_INDEX_DIR", PERSIST_DIRECTORIES.get(VECTOR_BACKEND, "./vector_index"))
+EMBEDDING_MODEL = "openai.text-embedding-3-small"
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+
+# Anything that changes the vectors for the same input invalidates the manifest.
+INDEX_SETTINGS = {
+    "embedding_model": EMBEDDING_MODEL,
+    "chunk_size": CHUNK_SIZE,
+    "chunk_overlap": CHUNK_OVERLAP,
+    "backend": VECTOR_BACKEND,
+}
+
+
+@dataclass(frozen=True)
+class KnowledgeBaseIndex:
+    store: vector_store.VectorStore
+    retriever: HybridRetriever
+    status: str  # "built", "updated" or "reused"
+    version: str
+    added: int = 0
+    removed: int = 0
+    ingest_stats: ingest.IngestStats = None
+
+
+_index_lock = threading.Lock()
+_index = None
+
+
+# Shared by every caller in the process so the cache's hit/miss counters
+# cover all embedding traffic. langchain and langchain_community take seconds
+# to import, so they are only loaded once something actually needs them.
+@functools.lru_cache(maxsize=1)
+def get_embeddings():
+    from langchain_community.embeddings import OpenAIEmbeddings
+
+    return CachedEmbeddings(
+        OpenAIEmbeddings(model=EMBEDDING_MODEL, api_key=OPENAI_API_KEY, http_client=llm_client.get_http_client()),
+        model=EMBEDDING_MODEL,
+    )
+
+
+def get_splitter():
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+def _open_and_sync(pdf_paths, persist_directory, workers):
+    store = vector_store.open_store(VECTOR_BACKEND, persist_directory, get_embeddings())
+    was_empty = store.count() == 0
+    manifest_path = os.path.join(persist_directory, kb_manifest.MANIFEST_NAME)
+    lexical_index = BM25Index.load(persist_directory)
+    manifest, added, removed, stats = ingest.sync_index(
+        store, pdf_paths, manifest_path, get_splitter(), INDEX_SETTINGS,
+        workers=workers, lexical_index=lexical_index,
+    )
+    if len(lexical_index) != store.count():
+        # Index built before the BM25 side existed, or with an older
+        # tokenizer: fill it from the stored chunks, which needs no
+        # embedding calls.
+        lexical_index.clear()
+        ids = store.ids()
+        lexical_index.add(ids, [doc.page_content for doc in store.get_documents(ids)])
+    lexical_index.save(persist_directory)
+
+    if was_empty:
+        status = "built"
+    elif added or removed:
+        status = "updated"
+    else:
+        status = "reused"
+    version = kb_manifest.content_version(manifest)
+    return KnowledgeBaseIndex(
+        store=store,
+        retriever=HybridRetriever(store, lexical_index, query_cache=QueryCache(), version=version),
+        status=status,
+        version=version,
+        added=added,
+        removed=removed,
+        ingest_stats=stats,
+    )
+
+
+# Returns the process-wide index, opening the persisted one and embedding
+# only what changed since it was last synced. Safe to call from any number
+# of sessions/threads; the store is shared read-only.
+def load_index(pdf_paths=PDF_PATHS, persist_directory=PERSIST_DIRECTORY, workers=None):
+    global _index
+    if _index is not None:
+        return _index
+    with _index_lock:
+        if _index is None:
+            _index = _open_and_sync(pdf_paths, persist_directory, workers)
+            logger.info(
+                "Knowledge base index %s from %s (+%d/-%d chunks; %s)",
+                _index.status, persist_directory, _index.added, _index.removed,
+                _index.ingest_stats.summary(),
+            )
+    return _index
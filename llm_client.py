@@ -0,0 +1,126 @@
+import functools
+import importlib.util
+import logging
+import os
+import threading
+import time
+
+import httpx
+from openai import AzureOpenAI, OpenAI
+
+logger = logging.getLogger(__name__)
+
+# One HTTP connection pool per process, shared by every OpenAI client the
+# apps use, so a chat turn reuses a warm keep-alive connection instead of
+# paying for a fresh TCP + TLS handshake. Connection setup is traced through
+# httpcore so connection_stats() shows how often that actually happens.
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT_SECONDS", "60"))
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "120"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+AZURE_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2023-06-01-preview")
+
+# HTTP/2 needs the optional h2 package (pip install "httpx[http2]").
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+class ConnectionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.setup_seconds = 0.0
+
+    def record(self, new_connection, setup_seconds):
+        with self._lock:
+            self.requests += 1
+            if new_connection:
+                self.new_connections += 1
+                self.setup_seconds += setup_seconds
+
+    def stats(self):
+        with self._lock:
+            reused = self.requests - self.new_connections
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused": reused,
+                "reuse_rate": reused / self.requests if self.requests else 0.0,
+                "avg_setup_ms": 1000 * self.setup_seconds / self.new_connections if self.new_connections else 0.0,
+                "http2": HTTP2,
+            }
+
+
+_stats = ConnectionStats()
+
+
+# httpcore calls this with "<stage>.started" / "<stage>.complete" events for
+# each request. Only a request that opens a connection sees connect_tcp and
+# start_tls; one that reuses a pooled connection goes straight to sending.
+class _RequestTrace:
+    SETUP_EVENTS = ("connection.connect_tcp", "connection.start_tls")
+
+    def __init__(self):
+        self.new_connection = False
+        self.setup_seconds = 0.0
+        self._started = None
+
+    def __call__(self, event_name, info):
+        stage, _, phase = event_name.rpartition(".")
+        if stage in self.SETUP_EVENTS:
+            if phase == "started":
+                self.new_connection = True
+                self._started = time.perf_counter()
+            elif phase in ("complete", "failed") and self._started is not None:
+                self.setup_seconds += time.perf_counter() - self._started
+                self._started = None
+        elif stage.endswith("send_request_headers") and phase == "started":
+            _stats.record(self.new_connection, self.setup_seconds)
+
+
+def _attach_trace(request):
+    request.extensions["trace"] = _RequestTrace()
+
+
+@functools.lru_cache(maxsize=None)
+def get_http_client():
+    logger.info("Creating shared HTTP client (http2=%s, keepalive=%d)", HTTP2, MAX_KEEPALIVE)
+    return httpx.Client(
+        http2=HTTP2,
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        event_hooks={"request": [_attach_trace]},
+    )
+
+
+# The key and base URL come from OPENAI_API_KEY / OPENAI_BASE_URL, so call
+# load_dotenv() before the first call when the app uses a .env file.
+@functools.lru_cache(maxsize=None)
+def get_client():
+    return OpenAI(
+        http_client=get_http_client(),
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        max_retries=MAX_RETRIES,
+    )
+
+
+# Reads AZURE_OPENAI_ENDPOINT / AZURE_OPENAI_API_KEY from the environment.
+@functools.lru_cache(maxsize=None)
+def get_azure_client(deployment="gpt-4o", api_version=AZURE_API_VERSION):
+    return AzureOpenAI(
+        azure_deployment=deployment,
+        api_version=api_version,
+        http_client=get_http_client(),
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        max_retries=MAX_RETRIES,
+    )
+
+
+def connection_stats():
+    return _stats.stats()
@@ -0,0 +1,203 @@
+import argparse
+import math
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Drives N simulated sessions of each app through a few chat turns with
+# Streamlit's AppTest, against the local mock API unless --base-url is given:
+#   python loadtest.py --sessions 20 --turns 3
+#   python loadtest.py --apps summary.py --ttft-ms 800 --error-rate 0.05
+# and reports throughput, TTFT and turn latency percentiles, errors and
+# memory per session for each app. TTFT comes from the apps' own StreamMeter
+# records; turn latency is the wall time of the whole script run.
+APPS = ("rag_safebot.py", "chat_with_pdf.py", "summary.py")
+QUESTIONS = (
+    "How can I tell if an email from my bank is a phishing scam?",
+    "What should I do if a pop-up says my computer is infected?",
+    "Is it safe to use public Wi-Fi for online banking?",
+    "How do I make a strong password I can remember?",
+    "Someone called saying they're from Microsoft support. What now?",
+)
+DOCUMENT_PARAGRAPH = (
+    "Section {i}. Scammers often pretend to be a bank, a delivery company or tech support. "
+    "They create urgency, ask for codes or gift cards, and send links to lookalike websites. "
+    "Check the address, call back on a number you trust, and never share one-time passcodes."
+)
+
+# chat_with_pdf needs an upload, which AppTest can't provide, so it runs
+# through this wrapper that hands the app a fixed in-memory file.
+_UPLOAD_HARNESS = """
+import runpy
+import streamlit as st
+
+
+class _Upload:
+    def __init__(self, path):
+        self.name = self.file_id = path.rsplit("/", 1)[-1]
+        with open(path, "rb") as f:
+            self._data = f.read()
+
+    def getvalue(self):
+        return self._data
+
+
+st.file_uploader = lambda *args, **kwargs: [_Upload({document!r})]
+runpy.run_path({app!r}, run_name="__main__")
+"""
+
+
+class CollectingLedger:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries = []
+
+    def record(self, model, app, session_id, prompt_tokens, completion_tokens, cached_tokens=0, **extra):
+        with self._lock:
+            self.entries.append({"model": model, "app": app, "prompt_tokens": prompt_tokens,
+                                 "completion_tokens": completion_tokens, **extra})
+
+    def close(self):
+        pass
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def _new_session(app, document, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    if os.path.basename(app) == "chat_with_pdf.py":
+        script = _UPLOAD_HARNESS.format(document=os.path.abspath(document), app=os.path.abspath(app))
+        return AppTest.from_string(script, default_timeout=timeout)
+    return AppTest.from_file(app, default_timeout=timeout)
+
+
+def _run_session(app, turns, document, timeout):
+    at = _new_session(app, document, timeout)
+    at.run()
+    # Wait for background work (document indexing) to enable the chat input.
+    deadline = time.monotonic() + timeout
+    while at.chat_input and at.chat_input[0].proto.disabled and time.monotonic() < deadline:
+        time.sleep(0.2)
+        at.run()
+
+    latencies = []
+    errors = len(at.exception)
+    for turn in range(turns):
+        started = time.perf_counter()
+        at.chat_input[0].set_value(QUESTIONS[turn % len(QUESTIONS)]).run()
+        latencies.append(time.perf_counter() - started)
+        errors += len(at.exception)
+    return at, latencies, errors
+
+
+def run_app(app, sessions, turns, concurrency, ledger, document, timeout):
+    app_name = os.path.splitext(os.path.basename(app))[0]
+    already_recorded = len(ledger.entries)
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(_run_session, app, turns, document, timeout) for _ in range(sessions)]
+        results = []
+        failures = 0
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as error:
+                failures += 1
+                print(f"  {app}: session failed: {error!r}")
+    elapsed = time.perf_counter() - started
+    # Measured while every finished session is still alive.
+    rss_after = rss_bytes()
+
+    latencies = [latency for _, session_latencies, _ in results for latency in session_latencies]
+    entries = [e for e in ledger.entries[already_recorded:] if e["app"] == app_name and "ttft_ms" in e]
+    ttfts = [e["ttft_ms"] / 1000 for e in entries]
+    return {
+        "app": app,
+        "sessions": sessions,
+        "turns": len(latencies),
+        "errors": sum(errors for _, _, errors in results) + failures,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "ttft": [percentile(ttfts, q) for q in (50, 95, 99)],
+        "latency": [percentile(latencies, q) for q in (50, 95, 99)],
+        "mb_per_session": max(rss_after - rss_before, 0) / max(len(results), 1) / (1024 * 1024),
+    }
+
+
+def _write_document(directory, paragraphs=200):
+    path = os.path.join(directory, "loadtest_handout.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(DOCUMENT_PARAGRAPH.format(i=i) for i in range(paragraphs)))
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the Streamlit apps.")
+    parser.add_argument("--apps", nargs="+", default=list(APPS))
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=None, help="sessions at once (default: all)")
+    parser.add_argument("--document", default=None, help="file chat_with_pdf sessions upload")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--base-url", default=None, help="test against this API instead of the mock")
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    base_url = args.base_url
+    if base_url is None:
+        import mock_openai
+
+        settings = mock_openai.MockSettings(
+            ttft_ms=args.ttft_ms, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+        )
+        base_url = mock_openai.MockOpenAIServer(settings=settings).start().base_url
+        os.environ["OPENAI_API_KEY"] = "mock"
+        # Mock embeddings must never land in the real caches and index.
+        os.environ["EMBEDDING_CACHE_DIR"] = os.path.join(workdir, "embedding_cache")
+        os.environ["VECTOR_INDEX_DIR"] = os.path.join(workdir, "vector_index")
+    # Simulated sessions never land in the real session database either.
+    os.environ["SESSION_DB_PATH"] = os.path.join(workdir, "sessions.db")
+    # Set before any app module is imported; they read these at import time.
+    os.environ["OPENAI_BASE_URL"] = os.environ["OPENAI_API_BASE"] = base_url
+
+    import usage_ledger
+
+    ledger = CollectingLedger()
+    usage_ledger.set_ledger(ledger)
+    document = args.document or _write_document(workdir)
+
+    print(f"API: {base_url}; {args.sessions} sessions x {args.turns} turns per app")
+    print(f"{'app':<18} {'turns':>5} {'err':>4} {'turns/s':>8} "
+          f"{'TTFT p50/p95/p99 s':>20} {'latency p50/p95/p99 s':>23} {'MB/session':>11}")
+    for app in args.apps:
+        row = run_app(app, args.sessions, args.turns, args.concurrency or args.sessions, ledger, document, args.timeout)
+        ttft = "/".join(f"{value:.2f}" for value in row["ttft"])
+        latency = "/".join(f"{value:.2f}" for value in row["latency"])
+        print(f"{app:<18} {row['turns']:>5} {row['errors']:>4} {row['throughput']:>8.2f} "
+              f"{ttft:>20} {latency:>23} {row['mb_per_session']:>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# A local stand-in for the OpenAI endpoints the apps use - chat completions
+# (streamed or not, with the include_usage block), embeddings and the model
+# list - so the apps can be load-tested without keys or network:
+#   python mock_openai.py --port 8100 --ttft-ms 400 --tokens-per-second 40
+#   OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_BASE=http://127.0.0.1:8100/v1 \
+#       OPENAI_API_KEY=mock streamlit run summary.py
+# Replies are canned text, embeddings are deterministic per input, and every
+# message prefix is remembered, so a request reports as cached the longest
+# run of leading messages it shares with an earlier one, the way the real
+# prompt cache does.
+REPLY_WORDS = (
+    "Stay safe online by checking the sender's address, hovering over links before you click, "
+    "never sharing passwords or one-time codes, and calling the company back on a number you trust."
+).split()
+MODELS = ("gpt-4o", "gpt-4o-mini", "gpt-4", "openai.gpt-4o", "openai.text-embedding-3-small", "text-embedding-3-small")
+
+
+@dataclass
+class MockSettings:
+    ttft_ms: float = 300.0
+    tokens_per_second: float = 50.0
+    reply_tokens: int = 60
+    embedding_dim: int = 1536
+    embedding_latency_ms: float = 50.0
+    error_rate: float = 0.0
+    error_status: int = 500
+    # The real cache only serves prefixes of 1024+ tokens.
+    cache_min_tokens: int = 1024
+
+
+def _estimate_tokens(text):
+    return max(len(text) // 4, 1)
+
+
+def _message_tokens(message):
+    return _estimate_tokens(str(message.get("content", ""))) + 3
+
+
+def _embedding(item, dim):
+    seed = int.from_bytes(hashlib.sha256(json.dumps(item).encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    @property
+    def settings(self):
+        return self.server.settings
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [
+                {"id": model, "object": "model", "created": 0, "owned_by": "mock"} for model in MODELS
+            ]})
+        else:
+            self._send_json(404, {"error": {"message": f"No route for {self.path}", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        body = self._read_body()
+        self.server.count_request()
+        if random.random() < self.settings.error_rate:
+            self._send_json(self.settings.error_status, {"error": {"message": "Injected failure", "type": "server_error"}})
+        elif self.path.endswith("/chat/completions"):
+            self._chat(body)
+        elif self.path.endswith("/embeddings"):
+            self._embeddings(body)
+        else:
+            self._send_json(404, {"error": {"message": f"No route for {self.path}", "type": "invalid_request_error"}})
+
+    def _usage(self, messages, completion_tokens):
+        prompt_tokens = sum(_message_tokens(m) for m in messages) + 3
+        cached_tokens = self.server.cached_prefix_tokens(messages)
+        if cached_tokens < self.settings.cache_min_tokens:
+            cached_tokens = 0
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+
+    def _chat(self, body):
+        model = body.get("model", "gpt-4o")
+        messages = body.get("messages", [])
+        words = [REPLY_WORDS[i % len(REPLY_WORDS)] for i in range(min(body.get("max_tokens") or 10**9, self.settings.reply_tokens))]
+        usage = self._usage(messages, len(words))
+        completion_id = f"chatcmpl-mock-{random.getrandbits(48):x}"
+        created = int(time.time())
+        time.sleep(self.settings.ttft_ms / 1000)
+
+        if not body.get("stream"):
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(words)}}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(choices, usage=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": choices, "usage": usage}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        interval = 1 / self.settings.tokens_per_second if self.settings.tokens_per_second > 0 else 0
+        event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(interval)
+            event([{"index": 0, "delta": {"content": word if i == 0 else f" {word}"}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            event([], usage)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _embeddings(self, body):
+        inputs = body.get("input", [])
+        # A single string, a list of strings, or token arrays (langchain sends
+        # token ids when it checks context length).
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        time.sleep(self.settings.embedding_latency_ms / 1000)
+        dim = body.get("dimensions") or self.settings.embedding_dim
+        tokens = sum(len(item) if isinstance(item, list) else _estimate_tokens(item) for item in inputs)
+        self._send_json(200, {
+            "object": "list",
+            "model": body.get("model", "text-embedding-3-small"),
+            "data": [{"object": "embedding", "index": i, "embedding": _embedding(item, dim)} for i, item in enumerate(inputs)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, settings=None):
+        super().__init__((host, port), _Handler)
+        self.settings = settings or MockSettings()
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._prefixes = set()  # digests of every message prefix seen
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    # Tokens in the longest run of leading messages an earlier request also
+    # started with; then remembers this request's prefixes.
+    def cached_prefix_tokens(self, messages):
+        digest = hashlib.sha256()
+        keys, tokens = [], []
+        for message in messages:
+            digest.update(json.dumps(message, sort_keys=True).encode())
+            keys.append(digest.copy().digest())
+            tokens.append((tokens[-1] if tokens else 0) + _message_tokens(message))
+        with self._lock:
+            cached = 0
+            for key, total in zip(keys, tokens):
+                if key not in self._prefixes:
+                    break
+                cached = total
+            self._prefixes.update(keys)
+        return cached
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="mock-openai", daemon=True)
+        thread.start()
+        return self
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--ttft-ms", type=float, default=MockSettings.ttft_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=MockSettings.tokens_per_second)
+    parser.add_argument("--reply-tokens", type=int, default=MockSettings.reply_tokens)
+    parser.add_argument("--embedding-dim", type=int, default=MockSettings.embedding_dim)
+    parser.add_argument("--embedding-latency-ms", type=float, default=MockSettings.embedding_latency_ms)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="status for injected failures, e.g. 429")
+    parser.add_argument("--cache-min-tokens", type=int, default=MockSettings.cache_min_tokens,
+                        help="shortest system prefix reported as cached")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    settings = MockSettings(
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens,
+        embedding_dim=args.embedding_dim,
+        embedding_latency_ms=args.embedding_latency_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        cache_min_tokens=args.cache_min_tokens,
+    )
+    server = MockOpenAIServer(args.host, args.port, settings)
+    logger.info("Mock OpenAI API listening on %s", server.base_url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
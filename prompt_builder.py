@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+
+from token_counter import TOKENS_PER_REPLY, count_message, count_text, get_encoding
+
+logger = logging.getLogger(__name__)
+
+# Fits the system instructions, retrieved context and chat history into a
+# fixed token budget so prompts stop growing with the conversation. Priority:
+#   1. the system instructions (if any) and the newest message, always;
+#   2. the newest earlier turns, up to HISTORY_SHARE of what is left;
+#   3. context chunks in rank order in whatever remains (the last one that
+#      only partly fits is cut to size).
+#
+# Messages are laid out stable-first so the provider's prompt cache can reuse
+# the prefix: the fixed instructions, then the history (which only grows at
+# its end), then this turn's context, then the newest message. Anything that
+# changes per question therefore comes after everything that doesn't.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "8000"))
+HISTORY_SHARE = float(os.getenv("PROMPT_HISTORY_SHARE", "0.5"))
+
+
+def _truncate(text, tokens, model):
+    encoding = get_encoding(model)
+    return encoding.decode(encoding.encode(text)[:tokens])
+
+
+@dataclass
+class PromptPlan:
+    messages: list
+    tokens: int
+    budget: int
+    chunks_used: int = 0
+    chunks_dropped: int = 0
+    chunk_truncated: bool = False
+    turns_dropped: int = 0
+    prefix_hash: str = ""  # of the instructions message; constant while the prefix is
+
+    def report(self):
+        return (
+            f"{self.tokens}/{self.budget} tokens; "
+            f"context {self.chunks_used} kept, {self.chunks_dropped} dropped"
+            f"{' (last one truncated)' if self.chunk_truncated else ''}; "
+            f"history {self.turns_dropped} turns dropped"
+        )
+
+
+def build_prompt(
+    instructions,
+    history,
+    chunks=(),
+    budget=PROMPT_TOKEN_BUDGET,
+    model="gpt-4o",
+    history_share=HISTORY_SHARE,
+    separator="\n\n",
+    context_header=None,
+):
+    history = list(history)
+    chunks = list(chunks)
+    newest, earlier = history[-1:], history[:-1]
+    used = TOKENS_PER_REPLY
+    if instructions is not None:
+        used += count_message({"role": "system", "content": instructions}, model)
+    if chunks:
+        # The context message's own overhead and header.
+        used += count_message({"role": "system", "content": context_header or ""}, model)
+    used += sum(count_message(message, model) for message in newest)
+
+    # Newest turns first, stopping at the first one that doesn't fit so the
+    # kept history is always a contiguous tail of the conversation.
+    history_budget = max(budget - used, 0) * history_share
+    kept_history = []
+    history_used = 0
+    for message in reversed(earlier):
+        cost = count_message(message, model)
+        if history_used + cost > history_budget:
+            break
+        kept_history.append(message)
+        history_used += cost
+    kept_history.reverse()
+    used += history_used
+
+    kept_chunks = []
+    truncated = False
+    separator_tokens = count_text(separator, model)
+    for chunk in chunks:
+        cost = count_text(chunk, model) + separator_tokens
+        remaining = budget - used
+        if cost <= remaining:
+            kept_chunks.append(chunk)
+            used += cost
+        elif remaining > separator_tokens + 32:
+            kept_chunks.append(_truncate(chunk, remaining - separator_tokens, model))
+            used = budget
+            truncated = True
+            break
+        else:
+            break
+
+    messages = []
+    if instructions is not None:
+        messages.append({"role": "system", "content": instructions})
+    messages.extend(kept_history)
+    if kept_chunks:
+        context = [context_header, *kept_chunks] if context_header else kept_chunks
+        messages.append({"role": "system", "content": separator.join(context)})
+    messages.extend(newest)
+    plan = PromptPlan(
+        messages=messages,
+        tokens=used,
+        budget=budget,
+        chunks_used=len(kept_chunks),
+        chunks_dropped=len(chunks) - len(kept_chunks),
+        chunk_truncated=truncated,
+        turns_dropped=len(earlier) - len(kept_history),
+        prefix_hash=hashlib.sha256(json.dumps(messages[:1], sort_keys=True).encode()).hexdigest()[:12]
+        if instructions is not None else "",
+    )
+    if plan.chunks_dropped or plan.turns_dropped or truncated:
+        logger.info("Prompt trimmed: %s", plan.report())
+    return plan
@@ -0,0 +1,42 @@
+import os
+import re
+
+from lru import LRUCache
+
+# Shared in front of the retriever: normalized question -> query embedding,
+# and (normalized question, k, index version) -> ranked chunk ids. A question
+# someone already asked, in any session, skips the embedding round-trip and
+# the search; only the chunk texts are looked up again.
+EMBEDDING_ENTRIES = int(os.getenv("QUERY_CACHE_EMBEDDINGS", "4096"))
+RESULT_ENTRIES = int(os.getenv("QUERY_CACHE_RESULTS", "4096"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    return _WHITESPACE.sub(" ", query).strip().casefold()
+
+
+class QueryCache:
+    def __init__(self, embedding_entries=EMBEDDING_ENTRIES, result_entries=RESULT_ENTRIES):
+        self.embeddings = LRUCache(embedding_entries)
+        self.results = LRUCache(result_entries)
+
+    def embed(self, query, embed_query):
+        key = normalize_query(query)
+        vector = self.embeddings.get(key)
+        if vector is None:
+            vector = embed_query(query)
+            self.embeddings.put(key, vector)
+        return vector
+
+    def search(self, query, k, version, search):
+        key = (normalize_query(query), k, version)
+        ids = self.results.get(key)
+        if ids is None:
+            ids = tuple(search(query, k))
+            self.results.put(key, ids)
+        return ids
+
+    def stats(self):
+        return {"embeddings": self.embeddings.stats(), "results": self.results.stats()}
@@ -0,0 +1,155 @@
+import functools
+import json
+import os
+
+import streamlit as st
+
+import session_store
+
+# One engine for every quiz in the apps. The questions live in JSON files
+# under QUIZ_DIR, and each quiz is drawn inside its own st.fragment: a click
+# updates the quiz's state in a button callback and reruns only that
+# fragment, so feedback shows up after one small render instead of a sleep
+# and a full rerun of the page (retriever, chat history and all).
+#
+# Two kinds of quiz files:
+#   multiple_choice - tips, then questions with options, an answer and an
+#                     explanation; scored, with the best score per session.
+#   scenario        - named steps, each with text and choices that go to
+#                     another step, start another quiz, or post a message
+#                     to the chat.
+QUIZ_DIR = os.getenv("QUIZ_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "quizzes"))
+
+
+@functools.lru_cache(maxsize=None)
+def load_quiz(name):
+    with open(os.path.join(QUIZ_DIR, f"{name}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Best score per multiple-choice quiz this session, {name: score}.
+def high_scores():
+    if "quiz_high_scores" not in st.session_state:
+        st.session_state.quiz_high_scores = {}
+    return st.session_state.quiz_high_scores
+
+
+# ---- MULTIPLE CHOICE ----
+# session_state key holding a multiple-choice quiz's progress.
+def state_key(name):
+    return f"quiz_{name}"
+
+
+def _quiz_state(name):
+    key = state_key(name)
+    if key not in st.session_state:
+        st.session_state[key] = {"step": "tips", "question_index": 0, "score": 0, "tried_wrong": False, "feedback": None}
+    return st.session_state[key]
+
+
+# The callbacks look the state up when they run rather than holding on to
+# it: the session may have been saved to disk and reloaded in between.
+def _start(name):
+    session_store.reload()
+    _quiz_state(name).update(step="quiz", question_index=0, score=0, tried_wrong=False, feedback=None)
+
+
+def _review_tips(name):
+    session_store.reload()
+    _quiz_state(name).update(step="tips", feedback=None)
+
+
+# A point only for questions answered right on the first try.
+def _answer(name, option):
+    session_store.reload()
+    state = _quiz_state(name)
+    questions = load_quiz(name)["questions"]
+    q = questions[state["question_index"]]
+    if option != q["answer"]:
+        state["tried_wrong"] = True
+        state["feedback"] = ("error", f"❌ Incorrect. {q['explanation']}")
+        return
+    if not state["tried_wrong"]:
+        state["score"] += 1
+    state["tried_wrong"] = False
+    state["feedback"] = ("success", "✅ Correct!")
+    if state["question_index"] + 1 < len(questions):
+        state["question_index"] += 1
+    else:
+        state["step"] = "complete"
+        scores = high_scores()
+        scores[name] = max(scores.get(name, 0), state["score"])
+
+
+# Pages that show the high scores elsewhere pick up a new one on their next
+# full rerun; finishing a quiz doesn't force one.
+@st.fragment
+def render_quiz(name):
+    session_store.reload()
+    quiz = load_quiz(name)
+    questions = quiz["questions"]
+    state = _quiz_state(name)
+
+    if state["step"] == "tips":
+        if quiz.get("image"):
+            st.image(quiz["image"], width=300)
+        st.markdown("**Tips:**\n" + "\n".join(f"- {tip}" for tip in quiz["tips"]))
+        st.button("📝 Take the Quiz", key=f"{name}_quiz_start", on_click=_start, args=(name,))
+
+    elif state["step"] == "quiz":
+        if state["feedback"]:
+            kind, text = state["feedback"]
+            getattr(st, kind)(text)
+        index = state["question_index"]
+        q = questions[index]
+        st.markdown(f"**Q{index + 1}: {q['question']}**")
+        for option in q["options"]:
+            st.button(option, key=f"{name}_q{index}_{option}", on_click=_answer, args=(name, option))
+
+    elif state["step"] == "complete":
+        st.success("🎉 You've completed the quiz!")
+        st.markdown(f"**✅ Your Score:** {state['score']} / {len(questions)}")
+        st.markdown(f"🏆 **Highest Score:** {high_scores().get(name, 0)} / {len(questions)}")
+        st.button("🔁 Retake Quiz", key=f"{name}_quiz_retry", on_click=_start, args=(name,))
+        st.button("📖 Review Tips", key=f"{name}_quiz_back", on_click=_review_tips, args=(name,))
+    session_store.sync()
+
+
+# ---- SCENARIO ----
+def _choose(key, choice):
+    session_store.reload()
+    state = st.session_state[key]
+    if "quiz" in choice:
+        state.update(quiz=choice["quiz"], step="start")
+    else:
+        state["step"] = choice["next"]
+
+
+# Plays a chain of scenario quizzes starting with `first`. Choices that post
+# to the chat need the history, drawn outside the fragment, redrawn, so only
+# they rerun the whole app.
+@st.fragment
+def render_scenario(first, key="scenario_quiz", messages_key="messages"):
+    session_store.reload()
+    if key not in st.session_state:
+        st.session_state[key] = {"quiz": first, "step": "start"}
+    state = st.session_state[key]
+    step = load_quiz(state["quiz"])["steps"][state["step"]]
+
+    if step.get("success"):
+        st.success(step["success"])
+    if step.get("error"):
+        st.error(step["error"])
+    if step.get("markdown"):
+        st.markdown(step["markdown"])
+
+    for i, (column, choice) in enumerate(zip(st.columns(len(step["choices"])), step["choices"])):
+        button_key = f"{key}_{state['quiz']}_{state['step']}_{i}"
+        with column:
+            if "message" in choice:
+                if st.button(choice["label"], key=button_key):
+                    st.session_state[messages_key].append({"role": "assistant", "content": choice["message"]})
+                    st.rerun()
+            else:
+                st.button(choice["label"], key=button_key, on_click=_choose, args=(key, choice))
+    session_store.sync()
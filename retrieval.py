@@ -0,0 +1,64 @@
+import os
+
+# Hybrid retrieval: vector similarity and BM25 each nominate candidates, and
+# the two rankings are merged with weighted reciprocal rank fusion
+#   score(chunk) = sum(weight / (RRF_K + rank))
+# so a chunk ranked well by either method (exact term or meaning) makes the
+# cut, and one ranked well by both comes first.
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "3"))
+CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "10"))
+VECTOR_WEIGHT = float(os.getenv("RETRIEVAL_VECTOR_WEIGHT", "1.0"))
+LEXICAL_WEIGHT = float(os.getenv("RETRIEVAL_LEXICAL_WEIGHT", "1.0"))
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings, weights, rrf_k=RRF_K):
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever:
+    def __init__(
+        self,
+        store,
+        lexical_index,
+        k=RETRIEVAL_K,
+        candidates=CANDIDATES,
+        vector_weight=VECTOR_WEIGHT,
+        lexical_weight=LEXICAL_WEIGHT,
+        query_cache=None,
+        version=None,
+    ):
+        self.store = store
+        self.lexical_index = lexical_index
+        self.k = k
+        self.candidates = candidates
+        self.vector_weight = vector_weight
+        self.lexical_weight = lexical_weight
+        self.query_cache = query_cache
+        self.version = version
+
+    def embed_query(self, query):
+        if self.query_cache is None:
+            return self.store.embeddings.embed_query(query)
+        return self.query_cache.embed(query, self.store.embeddings.embed_query)
+
+    def ranked_ids(self, query, k):
+        candidates = max(self.candidates, k)
+        vector_hits = self.store.search_by_vector(self.embed_query(query), candidates)
+        lexical_hits = self.lexical_index.search(query, candidates)
+        return reciprocal_rank_fusion(
+            [[doc.metadata["chunk_id"] for doc, _ in vector_hits], [doc_id for doc_id, _ in lexical_hits]],
+            [self.vector_weight, self.lexical_weight],
+        )[:k]
+
+    def search(self, query, k=None):
+        k = k or self.k
+        if self.query_cache is None:
+            ids = self.ranked_ids(query, k)
+        else:
+            ids = self.query_cache.search(query, k, self.version, self.ranked_ids)
+        return self.store.get_documents(ids)
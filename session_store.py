@@ -0,0 +1,328 @@
+import argparse
+import atexit
+import functools
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Keeps the parts of st.session_state an app names (chat history, quiz
+# progress, scores) in a local SQLite database, so they survive a page
+# refresh or a container restart:
+#   session_store.attach("rag_safebot", ("messages", "quiz_high_scores"))  # top of the script
+#   session_store.sync()                                                  # end of each run
+# A browser session is identified by a random id in the page URL (?sid=...),
+# which is what a refresh keeps; anyone with the URL gets the session. Each
+# id belongs to one Streamlit session at a time: a new one taking it over is
+# a refresh, unless the old one is still connected - the URL is open in a
+# second tab - in which case the new tab moves to an id of its own.
+#
+# sync() only serializes the named keys and queues the ones that changed;
+# a background thread writes them in batches, so a run never waits on disk.
+# Sessions are read back lazily, the first time a run finds the keys missing.
+# Once a session has been idle for IDLE_SECONDS and everything it changed is
+# on disk, its keys are dropped from memory; its next run loads them again.
+DB_PATH = os.getenv("SESSION_DB_PATH", "./sessions/sessions.db")
+FLUSH_INTERVAL = float(os.getenv("SESSION_STORE_FLUSH_SECONDS", "1"))
+IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "900"))
+QUERY_PARAM = "sid"
+FLUSH_BATCH = 512
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_state (
+    app TEXT NOT NULL,
+    session TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (app, session, key)
+)
+"""
+
+
+def connect(path=DB_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    # WAL lets runs read sessions back while the writer is committing.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(SCHEMA)
+    return conn
+
+
+class _TrackedSession:
+    def __init__(self, owner, state, keys):
+        self.owner = owner  # the Streamlit session id using it
+        self.state = state  # the session's state mapping
+        self.keys = keys
+        self.saved = {}  # key -> hash of the JSON last queued, to skip unchanged values
+        self.version = 0  # bumped for every queued change
+        self.flushed = 0  # highest version on disk
+        self.last_seen = time.monotonic()
+
+
+class SessionStore:
+    def __init__(self, path=DB_PATH, flush_interval=FLUSH_INTERVAL, idle_seconds=IDLE_SECONDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.idle_seconds = idle_seconds
+        self.loads = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._sessions = {}  # (app, session id) -> _TrackedSession
+        self._queue = queue.Queue()
+        connect(path).close()
+        self._writer = threading.Thread(target=self._run, name="session-store", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # The Streamlit session id currently using a session, if it is in memory.
+    def owner(self, app, session_id):
+        with self._lock:
+            tracked = self._sessions.get((app, session_id))
+            return tracked.owner if tracked is not None else None
+
+    # Puts any of the keys the state is missing back from disk - after a
+    # refresh, a restart or an eviction - and starts tracking the session.
+    # `owner` is the Streamlit session id; the state mapping itself is
+    # wrapped anew for every run, so it can't tell sessions apart. With
+    # `source_id`, a new session starts as a copy of that one.
+    def restore(self, app, session_id, keys, state, owner, source_id=None):
+        keys = tuple(keys)
+        with self._lock:
+            tracked = self._sessions.get((app, session_id))
+            previous = None
+            if tracked is None or tracked.owner != owner:
+                previous = tracked if source_id is None else self._sessions.get((app, source_id))
+                tracked = self._sessions[(app, session_id)] = _TrackedSession(owner, state, keys)
+                if previous is not None and source_id is None:
+                    # A refresh: carry on from what the old session queued.
+                    tracked.version, tracked.flushed = previous.version, previous.flushed
+                    tracked.saved = dict(previous.saved)
+            tracked.state = state
+            tracked.keys = keys
+            tracked.last_seen = time.monotonic()
+            # Under the lock, so an eviction can't drop keys between the
+            # check and the load.
+            missing = [key for key in keys if key not in state]
+            if previous is not None:
+                # The other session's latest values may still be on their
+                # way to disk, so copy them over instead.
+                for key in [key for key in missing if key in previous.state]:
+                    try:
+                        state[key] = json.loads(json.dumps(previous.state[key]))
+                    except (TypeError, ValueError):
+                        continue
+                    missing.remove(key)
+            if missing:
+                for key, value in self._load(app, source_id or session_id, missing).items():
+                    state[key] = json.loads(value)
+                    if source_id is None:
+                        tracked.saved[key] = hash(value)
+
+    def _load(self, app, session_id, keys):
+        self.loads += 1
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            rows = conn.execute(
+                f"SELECT key, value FROM session_state WHERE app = ? AND session = ? "
+                f"AND key IN ({', '.join('?' * len(keys))})",
+                (app, session_id, *keys),
+            ).fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+
+    # Queues the tracked keys whose values changed since they were last
+    # queued. Values that aren't JSON (futures, widgets) are not persisted.
+    def save(self, app, session_id):
+        with self._lock:
+            tracked = self._sessions.get((app, session_id))
+            if tracked is None:
+                return
+            tracked.last_seen = time.monotonic()
+            changed = []
+            for key in tracked.keys:
+                if key not in tracked.state:
+                    continue
+                try:
+                    value = json.dumps(tracked.state[key], ensure_ascii=False)
+                except (TypeError, ValueError):
+                    logger.debug("Not persisting %s: not JSON-serializable", key)
+                    continue
+                if tracked.saved.get(key) != hash(value):
+                    tracked.saved[key] = hash(value)
+                    changed.append((key, value))
+            if not changed:
+                return
+            tracked.version += 1
+            self._queue.put((app, session_id, tracked.version, changed, time.time()))
+
+    def _run(self):
+        conn = connect(self.path)
+        rows = {}  # (app, session, key) -> (value, updated); kept until written
+        versions = {}
+        while True:
+            deadline = time.monotonic() + self.flush_interval
+            closing = False
+            for _ in range(FLUSH_BATCH):
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                app, session_id, version, changed, updated = item
+                # Later values of a key replace earlier ones in the batch.
+                for key, value in changed:
+                    rows[(app, session_id, key)] = (value, updated)
+                versions[(app, session_id)] = version
+            if rows:
+                try:
+                    with conn:
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO session_state VALUES (?, ?, ?, ?, ?)",
+                            [(*key, value, updated) for key, (value, updated) in rows.items()],
+                        )
+                except sqlite3.Error:
+                    logger.exception("Could not write %d session values to %s; retrying", len(rows), self.path)
+                else:
+                    rows.clear()
+                    with self._lock:
+                        for key, version in versions.items():
+                            tracked = self._sessions.get(key)
+                            if tracked is not None:
+                                tracked.flushed = max(tracked.flushed, version)
+                    versions.clear()
+            self._evict_idle()
+            if closing:
+                conn.close()
+                return
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [key for key, tracked in self._sessions.items()
+                    if tracked.last_seen < cutoff and tracked.flushed == tracked.version]
+            for key in idle:
+                tracked = self._sessions.pop(key)
+                for name in tracked.keys:
+                    try:
+                        del tracked.state[name]
+                    except KeyError:
+                        pass
+            self.evictions += len(idle)
+        if idle:
+            logger.info("Dropped %d idle sessions from memory", len(idle))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "pending": self._queue.qsize(),
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+
+@functools.lru_cache(maxsize=None)
+def get_store():
+    return SessionStore()
+
+
+# ---- STREAMLIT ----
+_ATTACHED = "_session_store"
+
+
+def _is_connected(streamlit_session_id):
+    from streamlit.runtime import Runtime
+
+    return Runtime.exists() and Runtime.instance().is_active_session(streamlit_session_id)
+
+
+def attach(app, keys):
+    import streamlit as st
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    store = get_store()
+    session_id = st.query_params.get(QUERY_PARAM)
+    source_id = None
+    if not session_id:
+        session_id = st.query_params[QUERY_PARAM] = uuid.uuid4().hex
+    else:
+        owner = store.owner(app, session_id)
+        if owner not in (None, ctx.session_id) and _is_connected(owner):
+            # Open in another tab too: carry on from its state under a new
+            # id, so the two tabs don't save over each other.
+            source_id = session_id
+            session_id = st.query_params[QUERY_PARAM] = uuid.uuid4().hex
+    st.session_state[_ATTACHED] = (app, session_id, tuple(keys))
+    store.restore(app, session_id, keys, ctx.session_state, ctx.session_id, source_id)
+
+
+# Widget callbacks and fragment reruns run without the script's attach(), so
+# the ones that read persisted keys call this first: the session may have
+# been dropped from memory while it sat idle.
+def reload():
+    import streamlit as st
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    attached = st.session_state.get(_ATTACHED)
+    if attached:
+        ctx = get_script_run_ctx()
+        get_store().restore(*attached, ctx.session_state, ctx.session_id)
+
+
+# Safe to call from fragments and from apps that never attached.
+def sync():
+    import streamlit as st
+
+    attached = st.session_state.get(_ATTACHED)
+    if attached:
+        get_store().save(*attached[:2])
+
+
+# ---- MAINTENANCE ----
+# python session_store.py --stats
+# python session_store.py --prune-days 30
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or prune the persisted chat sessions.")
+    parser.add_argument("--path", default=DB_PATH)
+    parser.add_argument("--stats", action="store_true", help="print sessions and size per app")
+    parser.add_argument("--prune-days", type=float, help="delete sessions not updated in this many days")
+    args = parser.parse_args(argv)
+
+    conn = connect(args.path)
+    if args.prune_days is not None:
+        cutoff = time.time() - args.prune_days * 86400
+        with conn:
+            deleted = conn.execute(
+                "DELETE FROM session_state WHERE (app, session) IN "
+                "(SELECT app, session FROM session_state GROUP BY app, session HAVING MAX(updated) < ?)",
+                (cutoff,),
+            ).rowcount
+        print(f"Deleted {deleted} values from sessions idle for over {args.prune_days:g} days")
+    if args.stats or args.prune_days is None:
+        rows = conn.execute(
+            "SELECT app, COUNT(DISTINCT session), SUM(LENGTH(value)) FROM session_state GROUP BY app ORDER BY app"
+        ).fetchall()
+        for app, sessions, size in rows:
+            print(f"{app:<16} {sessions:>6} sessions {size / 1024:>10.1f} KB")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
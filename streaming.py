@@ -0,0 +1,109 @@
+import argparse
+import os
+import time
+
+# st.write_stream sends a websocket delta carrying the whole text so far for
+# every chunk it is given, so a token-by-token stream costs one delta - and
+# one re-serialization of the growing answer - per token. coalesce() batches
+# tokens into frames: the first token goes out at once (time to first token
+# is unchanged), after that a frame is sent when FRAME_SECONDS have passed or
+# FRAME_CHARS have piled up, and whatever is left is flushed at the end.
+FRAME_SECONDS = float(os.getenv("STREAM_FRAME_MS", "50")) / 1000
+FRAME_CHARS = int(os.getenv("STREAM_FRAME_CHARS", "400"))
+
+
+def _text(chunk):
+    if isinstance(chunk, str):
+        return chunk
+    # A raw ChatCompletionChunk, for apps that don't meter their stream.
+    if chunk.choices and chunk.choices[0].delta.content:
+        return chunk.choices[0].delta.content
+    return ""
+
+
+def coalesce(chunks, interval=FRAME_SECONDS, max_chars=FRAME_CHARS, clock=time.monotonic):
+    buffer = []
+    size = 0
+    last_frame = None
+    for chunk in chunks:
+        text = _text(chunk)
+        if not text:
+            continue
+        buffer.append(text)
+        size += len(text)
+        now = clock()
+        if last_frame is None or now - last_frame >= interval or size >= max_chars:
+            yield "".join(buffer)
+            buffer.clear()
+            size = 0
+            last_frame = now
+    if buffer:
+        yield "".join(buffer)
+
+
+# Drop-in for st.write_stream: renders in frames, returns the full text.
+def write_stream(stream, interval=FRAME_SECONDS, max_chars=FRAME_CHARS):
+    import streamlit as st
+
+    return st.write_stream(coalesce(stream, interval, max_chars))
+
+
+# ---- BENCHMARK ----
+# python streaming.py --bench [--tokens 800] [--tokens-per-second 60]
+# Replays a synthetic answer at a realistic token rate and, for every delta
+# st.write_stream would send, builds and serializes the same markdown
+# ForwardMsg Streamlit does (or just encodes the text when Streamlit isn't
+# installed). Reports deltas, bytes and server CPU per answer, raw vs framed.
+def _serializer():
+    try:
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+    except ImportError:
+        return lambda text: len(text.encode("utf-8"))
+
+    def serialize(text):
+        msg = ForwardMsg()
+        msg.delta.new_element.markdown.body = text
+        return len(msg.SerializeToString())
+
+    return serialize
+
+
+def _simulated_stream(tokens, tokens_per_second):
+    words = ("Scammers often pretend to be your bank, so always call back on a number you trust. " * 200).split()
+    delay = 1 / tokens_per_second
+    for i in range(tokens):
+        time.sleep(delay)
+        yield words[i % len(words)] + " "
+
+
+def _render(frames, serialize):
+    text = ""
+    deltas = sent = 0
+    cpu_started = time.process_time()
+    for frame in frames:
+        text += frame
+        sent += serialize(text)
+        deltas += 1
+    return text, deltas, sent, time.process_time() - cpu_started
+
+
+def benchmark(tokens=800, tokens_per_second=60, interval=FRAME_SECONDS, max_chars=FRAME_CHARS):
+    serialize = _serializer()
+    raw = _render(_simulated_stream(tokens, tokens_per_second), serialize)
+    framed = _render(coalesce(_simulated_stream(tokens, tokens_per_second), interval, max_chars), serialize)
+    assert raw[0] == framed[0]
+    print(f"{tokens} tokens at {tokens_per_second}/s, frames every {interval * 1000:.0f} ms or {max_chars} chars")
+    print(f"{'':>8} {'deltas':>8} {'KB sent':>9} {'CPU ms':>8}")
+    for name, (_, deltas, sent, cpu) in (("raw", raw), ("framed", framed)):
+        print(f"{name:>8} {deltas:>8} {sent / 1024:>9.1f} {cpu * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream rendering micro-benchmark.")
+    parser.add_argument("--bench", action="store_true", required=True)
+    parser.add_argument("--tokens", type=int, default=800)
+    parser.add_argument("--tokens-per-second", type=float, default=60)
+    parser.add_argument("--frame-ms", type=float, default=FRAME_SECONDS * 1000)
+    parser.add_argument("--frame-chars", type=int, default=FRAME_CHARS)
+    args = parser.parse_args()
+    benchmark(args.tokens, args.tokens_per_second, args.frame_ms / 1000, args.frame_chars)
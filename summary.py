@@ -1,28 +1,42 @@
+import logging
 import streamlit as st
-from openai import OpenAI
+import chat_pane
+import llm_client
+import session_store
+import streaming
+import time
+import tracing
 from os import environ
-import tiktoken
+from concurrent.futures import ThreadPoolExecutor
+from token_counter import count_messages, count_text
+from usage_ledger import StreamMeter, current_session_id, record_response
+
+tracing.start_exporters()
+
+logger = logging.getLogger(__name__)
 
 # Set the title and caption of the Streamlit app
 st.title("Chatbot with Conversation Summary")
 st.caption("Powered by INFO-5940")
 
-# Function to count the number of tokens in a list of messages
-def count_tokens(messages):
-    encoding = tiktoken.encoding_for_model("gpt-4")
-    num_tokens = 0
-    for message in messages:
-        num_tokens += 4  # Base tokens for each message
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))  # Tokens for the content
-            if key == "name":
-                num_tokens += -1  # Adjust for the 'name' key
-    num_tokens += 2  # Additional tokens
-    return num_tokens
+# Summarize once the turns not yet in the summary pass this many tokens,
+# always keeping the newest few turns verbatim
+SUMMARY_TRIGGER_TOKENS = int(environ.get("SUMMARY_TRIGGER_TOKENS", "1500"))
+KEEP_RECENT_MESSAGES = 4
+SEGMENT_MAX_TOKENS = 150
+# When the summary segments together pass this, they are merged into one
+SUMMARY_MAX_TOKENS = 600
+
+
+# Summaries run here, after the answer has streamed, so nobody waits on them
+@st.cache_resource
+def get_summary_executor():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="summary")
+
 
 # Function to summarize a conversation using OpenAI's API
-def summarize_conversation(messages):
-    client = OpenAI(api_key=environ['OPENAI_API_KEY'])
+def summarize_conversation(messages, session_id=None, max_tokens=SEGMENT_MAX_TOKENS):
+    client = llm_client.get_client()
     summary_prompt = "Summarize the following conversation concisely:"
     for msg in messages:
         summary_prompt += f"\n{msg['role']}: {msg['content']}"
@@ -31,10 +45,32 @@ def summarize_conversation(messages):
     response = client.chat.completions.create(
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": summary_prompt}],
-        max_tokens=100
+        max_tokens=max_tokens
     )
+    record_response(response, "gpt-4o-mini", app="summary", session_id=session_id)
     return response.choices[0].message.content
 
+
+# Folds new turns into the running summary without re-reading the old ones:
+# the turns become one new segment, and only when the segments get too long
+# are they merged into a single higher-level summary.
+def fold_into_summary(segments, new_messages, session_id=None):
+    with tracing.span("summary", "summarize"):
+        segments = [*segments, summarize_conversation(new_messages, session_id)]
+    if count_text("\n".join(segments), model="gpt-4o-mini") > SUMMARY_MAX_TOKENS:
+        with tracing.span("summary", "merge_summaries"):
+            merged = summarize_conversation(
+                [{"role": "summary", "content": segment} for segment in segments],
+                session_id,
+                max_tokens=SUMMARY_MAX_TOKENS // 2,
+            )
+        segments = [merged]
+    return segments
+
+
+# Restore this conversation after a refresh or restart (not the pending summary job)
+session_store.attach("summary", ("messages", "total_tokens", "summary", "summary_segments", "summarized_upto"))
+
 # Initialize session state variables if they don't exist
 if "messages" not in st.session_state:
     st.session_state["messages"] = [{"role": "assistant", "content": "Hello! How can I help you today?"}]
@@ -42,26 +78,46 @@ if "total_tokens" not in st.session_state:
     st.session_state["total_tokens"] = 0
 if "summary" not in st.session_state:
     st.session_state["summary"] = ""
+if "summary_segments" not in st.session_state:
+    st.session_state["summary_segments"] = []
+if "summarized_upto" not in st.session_state:
+    st.session_state["summarized_upto"] = 0
+if "summary_job" not in st.session_state:
+    st.session_state["summary_job"] = None
+
+# Pick up a summary that finished in the background since the last run
+job = st.session_state["summary_job"]
+if job is not None and job[0].done():
+    st.session_state["summary_job"] = None
+    try:
+        st.session_state["summary_segments"] = job[0].result()
+        st.session_state["summarized_upto"] = job[1]
+        st.session_state["summary"] = "\n\n".join(st.session_state["summary_segments"])
+    except Exception:
+        # Keep the turns verbatim; the next trigger will try again
+        logger.exception("Summarization failed")
 
 # Display the chat messages
-for msg in st.session_state.messages:
-    st.chat_message(msg["role"]).write(msg["content"])
+chat_pane.render_history()
 
 # Handle user input
 if prompt := st.chat_input():
-    client = OpenAI(api_key=environ['OPENAI_API_KEY'])
+    client = llm_client.get_client()
+    turn_started = time.perf_counter()
 
     # Add user message to session state
     st.session_state.messages.append({"role": "user", "content": prompt})
     st.chat_message("user").write(prompt)
 
-    # Summarize conversation every 3 messages
-    if len(st.session_state.messages) % 3 == 0:
-        st.session_state["summary"] = summarize_conversation(st.session_state.messages)
-        st.session_state.messages = [
+    # Send the running summary plus only the turns it doesn't cover yet
+    recent_messages = st.session_state.messages[st.session_state["summarized_upto"]:]
+    if st.session_state["summary"]:
+        request_messages = [
             {"role": "system", "content": f"Previous conversation summary: {st.session_state['summary']}"},
-            {"role": "user", "content": prompt}
+            *recent_messages
         ]
+    else:
+        request_messages = recent_messages
 
     # Display the current summary in the sidebar
     if st.session_state["summary"]:
@@ -69,27 +125,55 @@ if prompt := st.chat_input():
         st.sidebar.write(st.session_state["summary"])
 
     # Count input tokens
-    input_tokens = count_tokens(st.session_state.messages)
+    input_tokens = count_messages(request_messages, model="gpt-4")
 
     # Generate assistant response
+    meter = StreamMeter("gpt-4", app="summary")
     with st.chat_message("assistant"):
         stream = client.chat.completions.create(
             model="gpt-4",
-            messages=st.session_state.messages,
+            messages=request_messages,
             stream=True,
+            stream_options={"include_usage": True},
         )
-        response = st.write_stream(stream)
+        response = streaming.write_stream(meter.wrap(stream))
+    tracing.observe_stream("summary", meter)
     st.session_state.messages.append({"role": "assistant", "content": response})
 
     # Count output tokens
-    output_tokens = count_tokens([{"role": "assistant", "content": response}])
+    output_tokens = count_text(response, model="gpt-4")
+
+    # Prefer the usage the API reported over the local estimate
+    if meter.reported:
+        input_tokens, output_tokens = meter.prompt_tokens, meter.completion_tokens
 
     # Update total tokens used
     st.session_state.total_tokens += input_tokens + output_tokens
 
+    # Once the unsummarized turns outgrow the budget, fold all but the newest
+    # few into the summary in the background; a later turn uses it when ready
+    unsummarized = st.session_state.messages[st.session_state["summarized_upto"]:]
+    if (
+        st.session_state["summary_job"] is None
+        and len(unsummarized) > KEEP_RECENT_MESSAGES
+        and count_messages(unsummarized, model="gpt-4") > SUMMARY_TRIGGER_TOKENS
+    ):
+        upto = len(st.session_state.messages) - KEEP_RECENT_MESSAGES
+        future = get_summary_executor().submit(
+            fold_into_summary,
+            list(st.session_state["summary_segments"]),
+            st.session_state.messages[st.session_state["summarized_upto"]:upto],
+            current_session_id(),
+        )
+        st.session_state["summary_job"] = (future, upto)
+    tracing.observe("summary", "total", time.perf_counter() - turn_started)
+
     # Display token usage in the sidebar
     st.sidebar.write(f"Tokens used in this interaction:")
     st.sidebar.write(f"Input: {input_tokens}")
     st.sidebar.write(f"Output: {output_tokens}")
     st.sidebar.write(f"Total: {input_tokens + output_tokens}")
-    st.sidebar.write(f"Total tokens used: {st.session_state.total_tokens}")
\ No newline at end of file
+    st.sidebar.write(f"Total tokens used: {st.session_state.total_tokens}")
+
+session_store.sync()
+tracing.render_debug_panel("summary")
@@ -0,0 +1,100 @@
+import json
+import urllib.request
+
+import pytest
+import tiktoken
+
+import mock_openai
+import prompt_builder
+import token_counter
+
+# Sends a few turns of a conversation, built the way the apps build them, to
+# the mock API and checks that the prompt cache keeps hitting: the first
+# system message must not change from turn to turn, and each turn's prompt
+# must start with the previous turn's instructions and history, which the
+# mock then reports as cached.
+INSTRUCTIONS = (
+    "You are a friendly assistant that helps older adults stay safe online. "
+    "Answer in short, plain sentences and suggest one concrete next step. "
+) * 8
+QUESTIONS = (
+    "How do I spot a phishing email?",
+    "Someone called saying they are from Microsoft. What should I do?",
+    "Is it safe to use the Wi-Fi at the library?",
+    "How do I turn on two-factor authentication?",
+)
+
+
+# tiktoken downloads its BPE files on first use. A byte-level encoding needs
+# no network and is enough to lay prompts out, so the tests run offline.
+@pytest.fixture(autouse=True)
+def offline_encoding(monkeypatch):
+    encoding = tiktoken.Encoding(
+        name="test-bytes",
+        pat_str=r"\S+|\s+",
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={},
+    )
+    monkeypatch.setattr(token_counter, "get_encoding", lambda model="gpt-4o": encoding)
+    monkeypatch.setattr(prompt_builder, "get_encoding", lambda model="gpt-4o": encoding)
+
+
+@pytest.fixture
+def server():
+    # A threshold below the instructions' size, so the cached path is taken.
+    settings = mock_openai.MockSettings(
+        ttft_ms=0, tokens_per_second=0, reply_tokens=20, embedding_latency_ms=0, cache_min_tokens=64
+    )
+    assert mock_openai._estimate_tokens(INSTRUCTIONS) >= settings.cache_min_tokens
+    server = mock_openai.MockOpenAIServer(settings=settings).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _chat(server, messages):
+    request = urllib.request.Request(
+        f"{server.base_url}/chat/completions",
+        data=json.dumps({"model": "gpt-4o", "messages": messages}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)
+
+
+def test_prefix_is_cached_across_turns(server):
+    history = [{"role": "assistant", "content": "How can I help?"}]
+    plans, cached = [], []
+    for turn, question in enumerate(QUESTIONS):
+        history.append({"role": "user", "content": question})
+        plan = prompt_builder.build_prompt(
+            INSTRUCTIONS,
+            history,
+            [f"Passage {turn}: never share one-time codes.", f"Passage {turn}: call back on a known number."],
+            context_header="Relevant passages:",
+        )
+        reply = _chat(server, plan.messages)
+        plans.append(plan)
+        cached.append(reply["usage"]["prompt_tokens_details"]["cached_tokens"])
+        history.append(reply["choices"][0]["message"])
+
+    assert len({plan.prefix_hash for plan in plans}) == 1
+    assert cached[0] == 0
+    for previous, plan, tokens in zip(plans, plans[1:], cached[1:]):
+        assert plan.turns_dropped == 0
+        # Instructions and history come first; this turn's context and
+        # question (the last two messages) come after them, so everything
+        # before them was already sent last turn and is served from cache.
+        stable = previous.messages[:-2]
+        assert plan.messages[:len(stable)] == stable
+        assert tokens >= sum(mock_openai._message_tokens(message) for message in stable)
+
+
+def test_changed_instructions_miss_the_cache(server):
+    history = [{"role": "user", "content": QUESTIONS[0]}]
+    first = prompt_builder.build_prompt(INSTRUCTIONS, history)
+    second = prompt_builder.build_prompt(INSTRUCTIONS + " Today is Tuesday.", history)
+
+    assert first.prefix_hash != second.prefix_hash
+    for plan in (first, second):
+        assert _chat(server, plan.messages)["usage"]["prompt_tokens_details"]["cached_tokens"] == 0
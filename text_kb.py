@@ -0,0 +1,265 @@
+import argparse
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from bm25 import BM25Index, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Picks which knowledge-base file (harvard.txt, cornell.txt, ...) a question
+# is about without a model round trip. A question that names exactly one
+# school goes to that file; otherwise BM25 scores the question against each
+# whole file, and a clear winner is taken. Only questions where no file wins
+# clearly go to the LLM router.
+#
+# Once a file is chosen, only its most relevant passages are sent, not the
+# whole file. TextKnowledgeBase keeps every file chunked and indexed in
+# memory and re-reads a file only when its mtime or size changes.
+KB_DIRECTORY = os.getenv("TEXT_KB_DIR", "/workspace/data/knowledge_base")
+NONE_FILE = "none.txt"
+ROUTER_MODEL = "gpt-4o-mini"
+# A keyword route needs at least this score and must beat the runner-up by
+# this fraction of its score.
+MIN_SCORE = float(os.getenv("ROUTER_MIN_SCORE", "1.0"))
+MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.5"))
+CHUNK_CHARS = int(os.getenv("TEXT_KB_CHUNK_CHARS", "800"))
+PASSAGES_K = int(os.getenv("TEXT_KB_PASSAGES", "4"))
+
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass(frozen=True)
+class Route:
+    file: Optional[str]  # None when the local router isn't sure
+    source: str  # "name", "keywords" or "llm"
+    score: float = 0.0
+    margin: float = 0.0
+
+    @property
+    def confident(self):
+        return self.file is not None
+
+
+def _list_files(directory):
+    if not os.path.isdir(directory):
+        logger.warning("Knowledge-base directory %s does not exist", directory)
+        return []
+    entries = [
+        entry for entry in os.scandir(directory)
+        if entry.name.endswith(".txt") and entry.name != NONE_FILE and entry.is_file()
+    ]
+    return sorted(entries, key=lambda entry: entry.name)
+
+
+def read_files(directory=KB_DIRECTORY):
+    files = {}
+    for entry in _list_files(directory):
+        with open(entry.path, "r", encoding="utf-8") as f:
+            files[entry.name] = f.read()
+    return files
+
+
+# Packs paragraphs into chunks of up to max_chars; a paragraph that is too
+# long on its own is split between sentences, and a sentence that is still
+# too long is cut.
+def split_text(text, max_chars=CHUNK_CHARS):
+    pieces = []
+    for paragraph in _PARAGRAPH.split(text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE.split(paragraph):
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+
+    chunks = []
+    current = ""
+    for piece in filter(None, pieces):
+        if current and len(current) + 2 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class KnowledgeBaseRouter:
+    def __init__(self, files, min_score=MIN_SCORE, min_margin=MIN_MARGIN):
+        self.files = sorted(files)
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self._names = {os.path.splitext(name)[0].lower(): name for name in self.files}
+        self._index = BM25Index()
+        self._index.add(self.files, [files[name] for name in self.files])
+
+    @classmethod
+    def from_directory(cls, directory=KB_DIRECTORY):
+        return cls(read_files(directory))
+
+    def route(self, prompt):
+        tokens = set(tokenize(prompt))
+        named = [name for stem, name in self._names.items() if stem in tokens]
+        if len(named) == 1:
+            return Route(named[0], "name", margin=1.0)
+        if named:
+            return Route(None, "name")
+
+        hits = self._index.search(prompt, k=2)
+        if not hits:
+            # Shares no terms with any file.
+            return Route(NONE_FILE, "keywords", margin=1.0)
+        best, score = hits[0]
+        runner_up = hits[1][1] if len(hits) > 1 else 0.0
+        margin = (score - runner_up) / score
+        if score >= self.min_score and margin >= self.min_margin:
+            return Route(best, "keywords", score, margin)
+        return Route(None, "keywords", score, margin)
+
+
+class _IndexedFile:
+    def __init__(self, path, signature):
+        with open(path, "r", encoding="utf-8") as f:
+            self.text = f.read()
+        self.signature = signature
+        self.chunks = split_text(self.text)
+        self.index = BM25Index()
+        self.index.add(range(len(self.chunks)), self.chunks)
+
+
+class TextKnowledgeBase:
+    def __init__(self, directory=KB_DIRECTORY):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._files = {}
+        self._router = None
+        self.reloads = 0
+        self.refresh()
+
+    # Re-reads only files whose mtime or size changed since the last call and
+    # drops deleted ones. Cheap enough to call on every turn: one stat per file.
+    def refresh(self):
+        with self._lock:
+            current = {}
+            changed = False
+            for entry in _list_files(self.directory):
+                stat = entry.stat()
+                signature = (stat.st_mtime_ns, stat.st_size)
+                indexed = self._files.get(entry.name)
+                if indexed is None or indexed.signature != signature:
+                    indexed = _IndexedFile(entry.path, signature)
+                    changed = True
+                    self.reloads += 1
+                current[entry.name] = indexed
+            if changed or current.keys() != self._files.keys() or self._router is None:
+                self._router = KnowledgeBaseRouter({name: f.text for name, f in current.items()})
+            self._files = current
+        return self
+
+    @property
+    def files(self):
+        return sorted(self._files)
+
+    @property
+    def router(self):
+        return self._router
+
+    # The k chunks of one file that best match the query, in file order so
+    # the passages read naturally. Falls back to the start of the file when
+    # nothing matches.
+    def passages(self, name, query, k=PASSAGES_K):
+        indexed = self._files.get(name)
+        if indexed is None:
+            return []
+        rows = [row for row, _ in indexed.index.search(query, k)] or range(min(k, len(indexed.chunks)))
+        return [indexed.chunks[row] for row in sorted(rows)]
+
+
+# The original router: ask a small model for the file name.
+def llm_route(client, prompt, files, app="chat_with_rag"):
+    from usage_ledger import record_response
+
+    response = client.chat.completions.create(model=ROUTER_MODEL,
+                                              messages=[
+            {
+                "role": "system",
+                "content": f"""Your job is to guess which knowledge base I need to load based on the user
+                prompt. The available knowledge bases are:
+                {", ".join(files)} if these are not related to the prompt please
+                output {NONE_FILE}.
+                I want you output to only be the name of the file. and nothing else.""",
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ])
+    record_response(response, ROUTER_MODEL, app=app)
+    answer = response.choices[0].message.content.strip()
+    return Route(answer if answer in files else NONE_FILE, "llm")
+
+
+def route_prompt(router, client, prompt):
+    decision = router.route(prompt)
+    if decision.confident:
+        return decision
+    return llm_route(client, prompt, router.files)
+
+
+# ---- ACCURACY REPORT ----
+# python text_kb.py --evaluate prompts.txt
+# Routes every prompt (one per line) with both routers and reports how often
+# the local router decides on its own, how often it agrees with the LLM
+# router when it does, and what each costs in time.
+def evaluate(prompts, router, client):
+    decided = agreed = 0
+    local_seconds = llm_seconds = 0.0
+    disagreements = []
+    for prompt in prompts:
+        started = time.perf_counter()
+        local = router.route(prompt)
+        local_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        reference = llm_route(client, prompt, router.files, app="text_kb_eval")
+        llm_seconds += time.perf_counter() - started
+
+        if local.confident:
+            decided += 1
+            if local.file == reference.file:
+                agreed += 1
+            else:
+                disagreements.append((prompt, local, reference.file))
+
+    total = len(prompts) or 1
+    print(f"Prompts: {len(prompts)}")
+    print(f"Routed locally: {decided} ({decided / total:.0%}), the rest fall back to the LLM")
+    print(f"Agreement with the LLM router on local routes: {agreed / (decided or 1):.0%}")
+    print(f"Local router: {local_seconds / total * 1e6:.0f} µs per prompt; "
+          f"LLM router: {llm_seconds / total * 1000:.0f} ms per prompt")
+    for prompt, local, expected in disagreements:
+        print(f"  {prompt!r}: local {local.file} ({local.source}, score {local.score:.2f}), LLM {expected}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the local knowledge-base router with the LLM router.")
+    parser.add_argument("--evaluate", metavar="PROMPTS", required=True, help="text file with one prompt per line")
+    parser.add_argument("--directory", default=KB_DIRECTORY)
+    args = parser.parse_args(argv)
+
+    import llm_client
+
+    with open(args.evaluate, "r", encoding="utf-8") as f:
+        prompts = [line.strip() for line in f if line.strip()]
+    evaluate(prompts, TextKnowledgeBase(args.directory).router, llm_client.get_client())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import functools
+import hashlib
+import os
+import time
+
+import tiktoken
+
+from lru import LRUCache
+
+# One place to count tokens. Encoders are loaded once per process and the
+# token count of every text is memoized, so counting a conversation each turn
+# only encodes the message that is new instead of the whole history again.
+CACHE_ENTRIES = int(os.getenv("TOKEN_COUNT_CACHE_ENTRIES", "65536"))
+BATCH_THREADS = int(os.getenv("TOKEN_COUNT_THREADS", "4"))
+
+# Chat formatting overhead per message, per name field and for priming the
+# reply. Current chat models (gpt-4, gpt-4o, gpt-4o-mini, gpt-3.5-turbo-0613+)
+# all use 3/1/3; only the original gpt-3.5-turbo-0301 differed.
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+TOKENS_PER_REPLY = 3
+LEGACY_OVERHEADS = {"gpt-3.5-turbo-0301": (4, -1)}
+
+_counts = LRUCache(CACHE_ENTRIES)
+
+
+def model_name(model):
+    # The Cornell gateway prefixes model ids, e.g. "openai.gpt-4o".
+    return model.removeprefix("openai.")
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model="gpt-4o"):
+    try:
+        return tiktoken.encoding_for_model(model_name(model))
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+# Keyed on a 16-byte digest of the text, not the text, so the cache doesn't
+# keep every message and file it has counted alive. Hashing is far cheaper
+# than encoding.
+def _key(encoding, text):
+    return encoding.name, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def count_text(text, model="gpt-4o"):
+    encoding = get_encoding(model)
+    key = _key(encoding, text)
+    count = _counts.get(key)
+    if count is None:
+        count = len(encoding.encode(text))
+        _counts.put(key, count)
+    return count
+
+
+# Counts many texts at once, encoding only the uncached ones with tiktoken's
+# multi-threaded encode_batch.
+def count_texts(texts, model="gpt-4o", num_threads=BATCH_THREADS):
+    encoding = get_encoding(model)
+    counts = [_counts.get(_key(encoding, text)) for text in texts]
+    missing = sorted({text for text, count in zip(texts, counts) if count is None})
+    if missing:
+        fresh = dict(zip(missing, map(len, encoding.encode_batch(missing, num_threads=num_threads))))
+        for text, count in fresh.items():
+            _counts.put(_key(encoding, text), count)
+        counts = [fresh[text] if count is None else count for text, count in zip(texts, counts)]
+    return counts
+
+
+def message_overheads(model):
+    return LEGACY_OVERHEADS.get(model_name(model), (TOKENS_PER_MESSAGE, TOKENS_PER_NAME))
+
+
+def count_message(message, model="gpt-4o"):
+    per_message, per_name = message_overheads(model)
+    tokens = per_message + sum(count_texts([str(value) for value in message.values()], model))
+    if "name" in message:
+        tokens += per_name
+    return tokens
+
+
+# Prompt tokens for a chat completion request with these messages.
+def count_messages(messages, model="gpt-4o"):
+    per_message, per_name = message_overheads(model)
+    values = [str(value) for message in messages for value in message.values()]
+    tokens = sum(count_texts(values, model)) + per_message * len(messages)
+    tokens += per_name * sum("name" in message for message in messages)
+    return tokens + TOKENS_PER_REPLY
+
+
+def cache_stats():
+    return _counts.stats()
+
+
+# ---- BENCHMARK ----
+# python token_counter.py --bench [--turns 200]
+# Times counting the whole conversation once per turn, the way the apps do,
+# with a fresh encoder call per message (the old count_tokens) and with this
+# module. The cached column should stay flat as the conversation grows.
+def _uncached_count(messages, encoding):
+    return sum(TOKENS_PER_MESSAGE + sum(len(encoding.encode(str(v))) for v in m.values()) for m in messages)
+
+
+def benchmark(turns=200, model="gpt-4o"):
+    encoding = get_encoding(model)
+    messages = []
+    print(f"{'turn':>6} {'uncached ms':>12} {'cached ms':>10}")
+    for turn in range(1, turns + 1):
+        messages.append({"role": "user", "content": f"Question {turn}: is this link safe? " * 20})
+        messages.append({"role": "assistant", "content": f"Answer {turn}: check the address first. " * 60})
+
+        started = time.perf_counter()
+        _uncached_count(messages, encoding)
+        uncached_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        count_messages(messages, model)
+        cached_ms = (time.perf_counter() - started) * 1000
+
+        if turn == 1 or turn % max(turns // 10, 1) == 0:
+            print(f"{turn:>6} {uncached_ms:>12.2f} {cached_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Token counting micro-benchmark.")
+    parser.add_argument("--bench", action="store_true", required=True)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--model", default="gpt-4o")
+    args = parser.parse_args()
+    benchmark(args.turns, args.model)
@@ -1,51 +1,47 @@
 import streamlit as st
-from openai import AzureOpenAI
-from openai import OpenAI
-from os import environ
-import tiktoken
+import chat_pane
+import llm_client
+import session_store
+import streaming
+from token_counter import count_messages, count_text
+from usage_ledger import StreamMeter
 
 st.title("Chatbot")
 st.caption("Powered by INFO-5940")
 
-def count_tokens(messages):
-    encoding = tiktoken.encoding_for_model("gpt-4")
-    num_tokens = 0
-    for message in messages:
-        num_tokens += 4  # every message follows <im_start>{role/name}\n{content}<im_end>\n
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
-            if key == "name":  # if there's a name, the role is omitted
-                num_tokens += -1  # role is always required and always 1 token
-    num_tokens += 2  # every reply is primed with <im_start>assistant
-    return num_tokens
-
+session_store.attach("tokens", ("messages", "total_tokens"))
 if "messages" not in st.session_state:
     st.session_state["messages"] = [{"role": "assistant", "content": "Hello! How can I help you today?"}]
 if "total_tokens" not in st.session_state:
     st.session_state["total_tokens"] = 0
 
-for msg in st.session_state.messages:
-    st.chat_message(msg["role"]).write(msg["content"])
+chat_pane.render_history()
 
 if prompt := st.chat_input():
 
-    client = OpenAI(api_key=environ['OPENAI_API_KEY'])
+    client = llm_client.get_client()
 
     st.session_state.messages.append({"role": "user", "content": prompt})
     st.chat_message("user").write(prompt)
 
-    input_tokens = count_tokens(st.session_state.messages)
+    input_tokens = count_messages(st.session_state.messages, model="gpt-4o")
 
+    meter = StreamMeter("gpt-4o", app="tokens")
     with st.chat_message("assistant"):
         stream = client.chat.completions.create(
             model="gpt-4o",
             messages=st.session_state.messages,
             stream=True,
+            stream_options={"include_usage": True},
         )
-        response = st.write_stream(stream)
+        response = streaming.write_stream(meter.wrap(stream))
     st.session_state.messages.append({"role": "assistant", "content": response})
 
-    output_tokens = count_tokens([{"role": "assistant", "content": response}])
+    output_tokens = count_text(response, model="gpt-4o")
+
+    # Prefer the usage the API reported over the local estimate
+    if meter.reported:
+        input_tokens, output_tokens = meter.prompt_tokens, meter.completion_tokens
 
     # Update total tokens
     st.session_state.total_tokens += input_tokens + output_tokens
@@ -59,3 +55,4 @@ if prompt := st.chat_input():
     # Display total tokens used in all interactions
     st.sidebar.write(f"Total tokens used: {st.session_state.total_tokens}")
 
+session_store.sync()
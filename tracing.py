@@ -0,0 +1,171 @@
+import bisect
+import functools
+import http.server
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Timing spans for the stages of a chat turn (query embedding, retrieval,
+# prompt building, routing, time to first token, streaming, summarizing).
+# Each span lands in a per-(app, stage) histogram; a span costs two clock
+# reads and a bucket increment, so it stays on in production. The histograms
+# are served in Prometheus text format on METRICS_PORT and/or rewritten to
+# METRICS_FILE (for node_exporter's textfile collector) when those are set,
+# and TRACING_PANEL=1 adds a latency panel to the apps' sidebars.
+METRIC_NAME = "chat_stage_seconds"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_FILE = os.getenv("METRICS_FILE")
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL_SECONDS", "15"))
+PANEL_ENABLED = os.getenv("TRACING_PANEL", "") == "1"
+RECENT_SPANS = 500
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    # Upper bound of the bucket holding the q-th quantile.
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self.recent = deque(maxlen=RECENT_SPANS)
+
+    def observe(self, app, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get((app, stage))
+            if histogram is None:
+                histogram = self._histograms[(app, stage)] = Histogram()
+            histogram.observe(seconds)
+            self.recent.append((time.time(), app, stage, seconds))
+
+    def histograms(self, app=None):
+        with self._lock:
+            return {key: h for key, h in self._histograms.items() if app is None or key[0] == app}
+
+    def render(self):
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent in each stage of a chat turn.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            for (app, stage), histogram in sorted(self._histograms.items()):
+                labels = f'app="{app}",stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{METRIC_NAME}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{METRIC_NAME}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def observe(app, stage, seconds):
+    registry.observe(app, stage, seconds)
+
+
+@contextmanager
+def span(app, stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(app, stage, time.perf_counter() - started)
+
+
+# Time to first token and full stream time from a finished StreamMeter.
+def observe_stream(app, meter):
+    if meter.first_token_seconds is not None:
+        registry.observe(app, "ttft", meter.first_token_seconds)
+    registry.observe(app, "stream", time.perf_counter() - meter.started)
+
+
+# ---- EXPORT ----
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_metrics_file(path):
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(f"{path}.tmp", path)
+
+
+def _write_periodically(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_metrics_file(path)
+        except OSError:
+            logger.exception("Could not write metrics to %s", path)
+
+
+# Starts whichever exporters are configured, once per process. Safe to call
+# on every rerun.
+@functools.lru_cache(maxsize=None)
+def start_exporters(port=METRICS_PORT, path=METRICS_FILE):
+    if port:
+        try:
+            server = http.server.ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+        except OSError:
+            logger.warning("Metrics port %s is taken; not serving metrics from this process", port)
+        else:
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info("Serving metrics on :%s", port)
+    if path:
+        threading.Thread(
+            target=_write_periodically, args=(path, METRICS_FILE_INTERVAL), name="metrics-file", daemon=True
+        ).start()
+
+
+# ---- DEBUG PANEL ----
+def render_debug_panel(app):
+    if not PANEL_ENABLED:
+        return
+    import streamlit as st
+
+    with st.sidebar.expander("⏱️ Latency"):
+        histograms = registry.histograms(app)
+        if not histograms:
+            st.write("No requests timed yet.")
+        for (_, stage), histogram in sorted(histograms.items()):
+            st.write(f"{stage}: {histogram.count}× avg {histogram.sum / histogram.count:.3f}s, "
+                     f"p95 ≤ {histogram.quantile(0.95):g}s")
@@ -0,0 +1,278 @@
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Records the token usage the API reports for every completion (per model,
+# session and app) in an append-only JSON-lines file. Writes are queued and
+# flushed in batches by a background thread, so the chat path never waits on
+# disk. `python usage_ledger.py --report` rolls the file up.
+LEDGER_PATH = os.getenv("USAGE_LEDGER_PATH", "./usage/usage.jsonl")
+FLUSH_INTERVAL = float(os.getenv("USAGE_LEDGER_FLUSH_SECONDS", "2"))
+FLUSH_BATCH = 256
+QUEUE_SIZE = 10000
+
+# USD per million tokens: (input, cached input, output).
+PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4": (30.00, 30.00, 60.00),
+    "text-embedding-3-small": (0.02, 0.02, 0.0),
+}
+
+
+def cost(model, prompt_tokens, completion_tokens, cached_tokens=0):
+    prices = PRICES.get(model.removeprefix("openai."))
+    if prices is None:
+        return 0.0
+    input_price, cached_price, output_price = prices
+    return (
+        (prompt_tokens - cached_tokens) * input_price
+        + cached_tokens * cached_price
+        + completion_tokens * output_price
+    ) / 1_000_000
+
+
+class UsageLedger:
+    def __init__(self, path=LEDGER_PATH, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._writer = threading.Thread(target=self._run, name="usage-ledger", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def record(self, model, app, session_id, prompt_tokens, completion_tokens, cached_tokens=0, **extra):
+        entry = {
+            "ts": time.time(),
+            "model": model,
+            "app": app,
+            "session": session_id,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "cost": cost(model, prompt_tokens, completion_tokens, cached_tokens),
+            **extra,
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            # Never block a chat turn on metering.
+            self.dropped += 1
+
+    def _write(self, batch):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in batch))
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            closing = False
+            while len(batch) < FLUSH_BATCH:
+                try:
+                    entry = self._queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+                except queue.Empty:
+                    break
+                if entry is None:
+                    closing = True
+                    break
+                batch.append(entry)
+            if batch:
+                try:
+                    self._write(batch)
+                except OSError:
+                    logger.exception("Could not write %d usage records to %s", len(batch), self.path)
+            if closing:
+                return
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                _ledger = UsageLedger()
+    return _ledger
+
+
+# Routes all metering to another ledger, e.g. the load test's collector.
+def set_ledger(ledger):
+    global _ledger
+    with _ledger_lock:
+        _ledger = ledger
+
+
+def current_session_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else None
+
+
+# Passes a streamed completion through to st.write_stream as text while
+# picking up the usage block the API sends last. Request the stream with
+# stream_options={"include_usage": True} so that block is present.
+class StreamMeter:
+    def __init__(self, model, app, session_id=None, ledger=None, **extra):
+        self.model = model
+        self.app = app
+        self.extra = extra  # recorded with the usage, e.g. prefix=plan.prefix_hash
+        self.session_id = session_id if session_id is not None else current_session_id()
+        self.ledger = ledger or get_ledger()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.reported = False
+        # Create the meter just before the request so this measures from it.
+        self.started = time.perf_counter()
+        self.first_token_seconds = None
+
+    def wrap(self, stream):
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    self.take_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if self.first_token_seconds is None:
+                        self.first_token_seconds = time.perf_counter() - self.started
+                    yield chunk.choices[0].delta.content
+        finally:
+            if self.reported:
+                timing = {}
+                if self.first_token_seconds is not None:
+                    timing["ttft_ms"] = round(self.first_token_seconds * 1000, 1)
+                self.ledger.record(
+                    self.model, self.app, self.session_id,
+                    self.prompt_tokens, self.completion_tokens, self.cached_tokens,
+                    total_ms=round((time.perf_counter() - self.started) * 1000, 1),
+                    **timing,
+                    **self.extra,
+                )
+
+    def take_usage(self, usage):
+        self.reported = True
+        self.prompt_tokens = usage.prompt_tokens
+        self.completion_tokens = usage.completion_tokens
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_tokens = getattr(details, "cached_tokens", None) or 0
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+
+# For non-streamed completions, which carry usage on the response itself.
+def record_response(response, model, app, session_id=None):
+    meter = StreamMeter(model, app, session_id)
+    if response.usage is not None:
+        meter.take_usage(response.usage)
+        meter.ledger.record(
+            model, app, meter.session_id,
+            meter.prompt_tokens, meter.completion_tokens, meter.cached_tokens,
+        )
+    return meter
+
+
+# ---- ROLLUPS ----
+def read_entries(path=LEDGER_PATH, since=None):
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash
+            if since is None or entry["ts"] >= since:
+                yield entry
+
+
+def rollup(entries):
+    by_model = defaultdict(
+        lambda: {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+    )
+    by_session = defaultdict(lambda: {"requests": 0, "tokens": 0, "cost": 0.0})
+    by_prefix = defaultdict(lambda: {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0})
+    first = last = None
+    for entry in entries:
+        tokens = entry["prompt_tokens"] + entry["completion_tokens"]
+        model = by_model[entry["model"]]
+        model["requests"] += 1
+        model["prompt_tokens"] += entry["prompt_tokens"]
+        model["cached_tokens"] += entry.get("cached_tokens", 0)
+        model["completion_tokens"] += entry["completion_tokens"]
+        model["cost"] += entry["cost"]
+        session = by_session[(entry["app"], entry["session"])]
+        session["requests"] += 1
+        session["tokens"] += tokens
+        session["cost"] += entry["cost"]
+        if entry.get("prefix"):
+            prefix = by_prefix[(entry["app"], entry["prefix"])]
+            prefix["requests"] += 1
+            prefix["prompt_tokens"] += entry["prompt_tokens"]
+            prefix["cached_tokens"] += entry.get("cached_tokens", 0)
+        first = entry["ts"] if first is None else min(first, entry["ts"])
+        last = entry["ts"] if last is None else max(last, entry["ts"])
+
+    total_tokens = sum(m["prompt_tokens"] + m["completion_tokens"] for m in by_model.values())
+    minutes = max((last - first) / 60, 1.0) if first is not None else 1.0
+    return {
+        "by_model": dict(by_model),
+        "by_session": dict(by_session),
+        "by_prefix": dict(by_prefix),
+        "tokens_per_minute": total_tokens / minutes,
+        "total_tokens": total_tokens,
+        "cached_share": sum(m["cached_tokens"] for m in by_model.values())
+        / max(sum(m["prompt_tokens"] for m in by_model.values()), 1),
+        "total_cost": sum(m["cost"] for m in by_model.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize recorded token usage.")
+    parser.add_argument("--report", action="store_true", required=True)
+    parser.add_argument("--path", default=LEDGER_PATH)
+    parser.add_argument("--since-minutes", type=float, default=None)
+    parser.add_argument("--top", type=int, default=10, help="most expensive sessions to list")
+    args = parser.parse_args(argv)
+
+    since = time.time() - args.since_minutes * 60 if args.since_minutes else None
+    summary = rollup(read_entries(args.path, since))
+    print(f"Total: {summary['total_tokens']} tokens, ${summary['total_cost']:.4f}, "
+          f"{summary['tokens_per_minute']:.0f} tokens/min, "
+          f"{summary['cached_share']:.0%} of prompt tokens served from the prompt cache")
+    for model, row in sorted(summary["by_model"].items()):
+        print(f"  {model}: {row['requests']} requests, {row['prompt_tokens']} in "
+              f"({row['cached_tokens']} cached) / {row['completion_tokens']} out, ${row['cost']:.4f}")
+    if summary["by_prefix"]:
+        print("Prompt prefixes (a stable prefix should show a rising cached share):")
+        for (app, prefix), row in sorted(summary["by_prefix"].items()):
+            share = row["cached_tokens"] / max(row["prompt_tokens"], 1)
+            print(f"  {app} {prefix}: {row['requests']} requests, {share:.0%} cached")
+    print("Most expensive sessions:")
+    sessions = sorted(summary["by_session"].items(), key=lambda item: item[1]["cost"], reverse=True)
+    for (app, session), row in sessions[:args.top]:
+        print(f"  {app} {session}: {row['requests']} requests, {row['tokens']} tokens, ${row['cost']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+import abc
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+# The apps retrieve through this small interface instead of a specific
+# vector database. Two backends ship with it:
+#   "numpy"  - exact search over a memory-mapped matrix of normalized vectors.
+#              Loads in milliseconds and, being a read-only mmap, is shared by
+#              every worker process through the OS page cache.
+#   "chroma" - the previous langchain Chroma store, kept as an option.
+BACKENDS = ("numpy", "chroma")
+
+
+class VectorStore(abc.ABC):
+    embeddings = None
+
+    @abc.abstractmethod
+    def add_documents(self, documents, ids):
+        ...
+
+    @abc.abstractmethod
+    def delete(self, ids):
+        ...
+
+    @abc.abstractmethod
+    def ids(self):
+        ...
+
+    def count(self):
+        return len(self.ids())
+
+    @abc.abstractmethod
+    def get_documents(self, ids):
+        ...
+
+    # Returns [(Document, cosine similarity)] best first.
+    @abc.abstractmethod
+    def search_by_vector(self, vector, k=4):
+        ...
+
+    def similarity_search(self, query, k=4):
+        return [doc for doc, _ in self.search_by_vector(self.embeddings.embed_query(query), k)]
+
+    def persist(self):
+        pass
+
+
+_Snapshot = namedtuple("_Snapshot", "ids texts metadatas matrix row_of")
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class NumpyVectorStore(VectorStore):
+    RECORDS_NAME = "records.json"
+
+    def __init__(self, directory, embeddings):
+        self.directory = directory
+        self.embeddings = embeddings
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._snapshot = self._load()
+
+    def _load(self):
+        path = os.path.join(self.directory, self.RECORDS_NAME)
+        if not os.path.exists(path):
+            return self._make_snapshot([], [], [], np.empty((0, 0), dtype=np.float32))
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        ids = records["ids"]
+        if ids:
+            matrix = np.memmap(
+                os.path.join(self.directory, records["vectors"]),
+                dtype=np.float32,
+                mode="r",
+                shape=(len(ids), records["dim"]),
+            )
+        else:
+            matrix = np.empty((0, records["dim"]), dtype=np.float32)
+        return self._make_snapshot(ids, records["texts"], records["metadatas"], matrix)
+
+    @staticmethod
+    def _make_snapshot(ids, texts, metadatas, matrix):
+        return _Snapshot(ids, texts, metadatas, matrix, {cid: row for row, cid in enumerate(ids)})
+
+    def _document(self, snapshot, row):
+        return Document(page_content=snapshot.texts[row], metadata=dict(snapshot.metadatas[row]))
+
+    def ids(self):
+        return list(self._snapshot.ids)
+
+    def count(self):
+        return len(self._snapshot.ids)
+
+    def get_documents(self, ids):
+        snapshot = self._snapshot
+        return [self._document(snapshot, snapshot.row_of[cid]) for cid in ids if cid in snapshot.row_of]
+
+    # Writers build a new snapshot and swap it in, so searches running on
+    # other threads never see a half-updated matrix.
+    def _replace(self, keep, new_ids=(), new_texts=(), new_metadatas=(), new_vectors=None):
+        snapshot = self._snapshot
+        matrix = snapshot.matrix[keep] if len(keep) else snapshot.matrix[:0]
+        if new_vectors is not None:
+            matrix = np.vstack([matrix, new_vectors]) if matrix.size else new_vectors
+        self._snapshot = self._make_snapshot(
+            [snapshot.ids[i] for i in keep] + list(new_ids),
+            [snapshot.texts[i] for i in keep] + list(new_texts),
+            [snapshot.metadatas[i] for i in keep] + list(new_metadatas),
+            matrix,
+        )
+        self._dirty = True
+
+    def add_documents(self, documents, ids):
+        texts = [doc.page_content for doc in documents]
+        vectors = _normalize_rows(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32))
+        with self._lock:
+            replaced = set(ids)
+            keep = [row for row, cid in enumerate(self._snapshot.ids) if cid not in replaced]
+            self._replace(keep, ids, texts, [dict(doc.metadata) for doc in documents], vectors)
+
+    def delete(self, ids):
+        with self._lock:
+            removed = set(ids)
+            keep = [row for row, cid in enumerate(self._snapshot.ids) if cid not in removed]
+            self._replace(keep)
+
+    def search_by_vector(self, vector, k=4):
+        snapshot = self._snapshot
+        count = len(snapshot.ids)
+        if not count:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = snapshot.matrix @ query
+        k = min(k, count)
+        if k < count:
+            top = np.argpartition(scores, -k)[-k:]
+            top = top[np.argsort(scores[top])[::-1]]
+        else:
+            top = np.argsort(scores)[::-1]
+        return [(self._document(snapshot, row), float(scores[row])) for row in top]
+
+    # Vectors go to a new file named after the write, and records.json is
+    # swapped in last, so readers (and other processes) always see a complete
+    # pair. The old file stays valid for anyone still mapping it.
+    def persist(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = self._snapshot
+            os.makedirs(self.directory, exist_ok=True)
+            records_path = os.path.join(self.directory, self.RECORDS_NAME)
+            old_vectors = None
+            if os.path.exists(records_path):
+                with open(records_path, "r", encoding="utf-8") as f:
+                    old_vectors = json.load(f).get("vectors")
+
+            matrix = np.ascontiguousarray(snapshot.matrix, dtype=np.float32)
+            vectors_name = f"vectors-{time.time_ns()}.f32"
+            matrix.tofile(os.path.join(self.directory, vectors_name))
+            records = {
+                "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+                "vectors": vectors_name,
+                "ids": snapshot.ids,
+                "texts": snapshot.texts,
+                "metadatas": snapshot.metadatas,
+            }
+            tmp_path = f"{records_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(records, f)
+            os.replace(tmp_path, records_path)
+            if old_vectors and old_vectors != vectors_name:
+                try:
+                    os.remove(os.path.join(self.directory, old_vectors))
+                except FileNotFoundError:
+                    pass
+
+            self._snapshot = self._load()
+            self._dirty = False
+
+
+class ChromaVectorStore(VectorStore):
+    def __init__(self, directory, embeddings):
+        from langchain_community.vectorstores import Chroma
+
+        self.embeddings = embeddings
+        self.store = Chroma(persist_directory=directory, embedding_function=embeddings)
+
+    def add_documents(self, documents, ids):
+        self.store.add_documents(documents, ids=ids)
+
+    def delete(self, ids):
+        self.store.delete(ids=ids)
+
+    def ids(self):
+        return self.store.get(include=[])["ids"]
+
+    def get_documents(self, ids):
+        found = self.store.get(ids=list(ids))
+        by_id = {
+            cid: Document(page_content=text, metadata=metadata or {})
+            for cid, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+        return [by_id[cid] for cid in ids if cid in by_id]
+
+    def search_by_vector(self, vector, k=4):
+        results = self.store.similarity_search_by_vector_with_relevance_scores(vector, k=k)
+        # Chroma returns squared L2 distance; for unit vectors that is 2 - 2cos.
+        return [(doc, 1.0 - distance / 2.0) for doc, distance in results]
+
+    def similarity_search(self, query, k=4):
+        return self.store.similarity_search(query, k=k)
+
+
+def open_store(backend, directory, embeddings):
+    if backend == "numpy":
+        return NumpyVectorStore(directory, embeddings)
+    if backend == "chroma":
+        return ChromaVectorStore(directory, embeddings)
+    raise ValueError(f"Unknown vector backend {backend!r}; expected one of {BACKENDS}")
+
+
+# ---- BENCHMARK ----
+# python vector_store.py --bench [--chunks 5000 --dim 1536 --queries 500]
+# Fills each backend with the same synthetic vectors, then reopens it in a
+# fresh process and measures open time, query latency and peak RSS.
+
+class _RandomEmbeddings:
+    def __init__(self, dim):
+        self.dim = dim
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def _bench_backend(backend, directory, dim, queries, results):
+    import resource  # Unix-only, and only the benchmark needs it
+
+    embeddings = _RandomEmbeddings(dim)
+    query_vectors = [embeddings.embed_query(f"query {i}") for i in range(queries)]
+
+    started = time.perf_counter()
+    store = open_store(backend, directory, embeddings)
+    open_ms = (time.perf_counter() - started) * 1000
+
+    latencies = []
+    for vector in query_vectors:
+        started = time.perf_counter()
+        store.search_by_vector(vector, k=4)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    results[backend] = {
+        "open_ms": open_ms,
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(len(latencies) * 0.95)],
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _fill_backend(backend, directory, chunks, dim):
+    store = open_store(backend, directory, _RandomEmbeddings(dim))
+    for start in range(0, chunks, 500):
+        ids = [f"chunk-{i}" for i in range(start, min(start + 500, chunks))]
+        store.add_documents([Document(page_content=cid, metadata={"source": "bench"}) for cid in ids], ids)
+    store.persist()
+
+
+def benchmark(backends=BACKENDS, chunks=5000, dim=1536, queries=500):
+    context = multiprocessing.get_context("spawn")
+    manager = context.Manager()
+    results = manager.dict()
+    workdir = tempfile.mkdtemp(prefix="vector-bench-")
+    try:
+        for backend in backends:
+            directory = os.path.join(workdir, backend)
+            try:
+                _fill_backend(backend, directory, chunks, dim)
+            except ImportError as error:
+                print(f"{backend}: skipped ({error})")
+                continue
+            process = context.Process(target=_bench_backend, args=(backend, directory, dim, queries, results))
+            process.start()
+            process.join()
+        for backend, row in results.items():
+            print(
+                f"{backend:>7}: open {row['open_ms']:8.1f} ms | query p50 {row['p50_ms']:6.2f} ms"
+                f" p95 {row['p95_ms']:6.2f} ms | peak RSS {row['peak_rss_mb']:7.1f} MB"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare vector backends.")
+    parser.add_argument("--bench", action="store_true", required=True)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    benchmark(args.backends, args.chunks, args.dim, args.queries)
@@ -0,0 +1,121 @@
+import argparse
+import ast
+import json
+import logging
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Run once when the container starts, before anyone opens an app:
+#   python warmup.py
+# It runs in its own process, so it only prepares what the server later
+# finds on disk: the tiktoken encoding files and the knowledge-base index.
+# The server still imports its libraries on the first page load. Every step
+# is best-effort: a failure is logged and the remaining steps still run.
+#
+#   python warmup.py --bench [app.py ...]
+# measures each app's import time, first paint and rerun time in a fresh
+# interpreter, so regressions on the startup path show up as numbers.
+ENCODING_MODELS = ("gpt-4o", "gpt-4", "gpt-4o-mini")
+APPS = ("Chatbot.py", "tokens.py", "summary.py", "chat_with_pdf.py", "chat_with_rag.py", "safe_rag.py", "rag_safebot.py")
+
+
+def _step(name, fn):
+    started = time.perf_counter()
+    try:
+        result = fn()
+    except Exception:
+        logger.exception("Warm-up step %r failed", name)
+        return None
+    logger.info("%s: %.2fs", name, time.perf_counter() - started)
+    return result
+
+
+def _load_encodings():
+    from token_counter import get_encoding
+
+    for model in ENCODING_MODELS:
+        get_encoding(model)
+
+
+def _build_index():
+    import knowledge_base
+
+    index = knowledge_base.load_index()
+    logger.info("Index %s (version %s): +%d/-%d chunks", index.status, index.version, index.added, index.removed)
+
+
+def warm(build_index=True):
+    _step("token encodings", _load_encodings)
+    if build_index:
+        _step("knowledge base", _build_index)
+
+
+# ---- BENCHMARK ----
+# Runs in a fresh interpreter per app: times importing the app's own imports,
+# then its first AppTest run (first paint) and a second run (a rerun, which
+# should cost almost nothing once the imports and caches are warm).
+_BENCH_SCRIPT = """
+import importlib, json, sys, time
+app, modules = sys.argv[1], sys.argv[2:]
+started = time.perf_counter()
+for module in modules:
+    importlib.import_module(module)
+import_seconds = time.perf_counter() - started
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(app, default_timeout=300)
+started = time.perf_counter()
+at.run()
+first_paint = time.perf_counter() - started
+started = time.perf_counter()
+at.run()
+rerun = time.perf_counter() - started
+print(json.dumps({"imports": import_seconds, "first_paint": first_paint, "rerun": rerun,
+                  "errors": len(at.exception)}))
+"""
+
+
+def app_imports(path):
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return modules
+
+
+def benchmark(apps=APPS):
+    print(f"{'app':<20} {'imports s':>10} {'first paint s':>14} {'rerun s':>8}")
+    for app in apps:
+        result = subprocess.run(
+            [sys.executable, "-c", _BENCH_SCRIPT, app, *app_imports(app)],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            print(f"{app:<20} failed: {result.stderr.strip().splitlines()[-1:]}")
+            continue
+        row = json.loads(result.stdout.strip().splitlines()[-1])
+        note = f"  ({row['errors']} script errors)" if row["errors"] else ""
+        print(f"{app:<20} {row['imports']:>10.2f} {row['first_paint']:>14.2f} {row['rerun']:>8.2f}{note}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm caches before the apps start, or benchmark startup.")
+    parser.add_argument("--bench", nargs="*", metavar="APP", help="benchmark startup of these apps (default: all)")
+    parser.add_argument("--skip-index", action="store_true", help="don't build the knowledge-base index")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    if args.bench is not None:
+        benchmark(args.bench or APPS)
+    else:
+        warm(build_index=not args.skip_index)
+
+
+if __name__ == "__main__":
+    main()